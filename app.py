@@ -1,14 +1,50 @@
 import streamlit as st
 from pathlib import Path
 import json
-import base64
 import os
 import logging
+import math
+import sqlite3
+import tempfile
+from image_store import MAX_DIMENSION, MAX_PIXELS, MAX_UPLOAD_BYTES, ImageStore, ImageTooLargeError, InvalidImageError
+from image_server import start_image_server
+from archive import ArchiveError, export_archive, import_archive
+from storage import ConflictError, open_storage
+from model import LOAD_FAILED, Achievements, BoardNotLoadedError, SharedAchievements, new_achievement_id, save_stats
+from migrations import SCHEMA_VERSION, import_migration, migrate
+from search_index import SORT_DEFAULT, SORT_NEWEST, SORT_OLDEST
+from render_cache import RenderCache, markup_key
+from events import CREATE, DELETE, EDIT, LOCK, UNLOCK, EventLog
+from ui_state import card_state, done_key, drop_card_state
+import perf
 
 # --- Настройка страницы ---
 st.set_page_config(page_title="Achievements", layout="wide")
+# Замеры включаются через ACHIEVEMENTS_PERF=1 (см. perf.py)
+perf.begin_run()
+# Пока идет весь скрипт, фрагменты учитываются в его замерах (см. achievement_fragment)
+script_running = True
 st.title("🏆 Achievement Board")
 
+# --- Сообщения, которые должны пережить перезапуск скрипта (st.rerun) ---
+def flash(message):
+    st.session_state.setdefault("_flash", []).append(message)
+
+for flash_message in st.session_state.pop("_flash", []):
+    st.success(flash_message)
+
+# --- Toast из колбэков ---
+# Колбэки карточек выполняются перед перезапуском фрагмента, а выводить элементы из них
+# во фрагменте нельзя, поэтому toast откладывается до тела фрагмента (или скрипта)
+def queue_toast(message):
+    st.session_state.setdefault("_toasts", []).append(message)
+
+def show_queued_toasts():
+    for message in st.session_state.pop("_toasts", []):
+        st.toast(message)
+
+show_queued_toasts()
+
 # --- Настройка логирования ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,104 +53,216 @@ BASE_DIR = Path(__file__).parent
 GRAY_IMG = BASE_DIR / "images/gray.png"
 GOLD_IMG = BASE_DIR / "images/gold.png"
 DATA_FILE = BASE_DIR / "data.json"
+DB_FILE = BASE_DIR / "data.db"
+EVENTS_FILE = BASE_DIR / "events.ndjson"
+IMAGE_STORE_DIR = BASE_DIR / "static" / "images"
+
+# Картинки хранятся отдельными файлами, в data.json — только ссылки на них
+@st.cache_resource
+def get_image_store():
+    """Одно хранилище картинок на процесс: его семафор ограничивает декодирование для всех сессий"""
+    return ImageStore(IMAGE_STORE_DIR)
+
+image_store = get_image_store()
+# Лимит загрузки картинки: больший файл отклоняется еще до того, как попадет в скрипт
+MAX_UPLOAD_MB = MAX_UPLOAD_BYTES // (1024 * 1024)
+
+# --- Хранилище достижений ---
+# ACHIEVEMENTS_STORAGE=json возвращает прежнее хранение в data.json.
+# В SQLite существующий data.json импортируется автоматически при первом запуске.
+STORAGE_BACKEND = os.environ.get("ACHIEVEMENTS_STORAGE", "sqlite")
+
+@st.cache_resource
+def get_storage(backend: str):
+    """Одно хранилище на процесс: схема базы проверяется один раз, а не на каждом запуске.
+
+    Тот же объект использует и общая доска (см. get_shared_achievements).
+    """
+    return open_storage(backend, DATA_FILE, DB_FILE, migrate=import_migration(image_store))
+
+storage = get_storage(STORAGE_BACKEND)
+
+# --- Раздача картинок по URL ---
+# По умолчанию хранилище отдается через static serving Streamlit (.streamlit/config.toml).
+# Если задан ACHIEVEMENTS_IMAGE_PORT, поднимается отдельный сервер с immutable кешированием.
+# Сервер слушает только localhost; чтобы отдавать картинки другим машинам, задайте
+# ACHIEVEMENTS_IMAGE_HOST (например, 0.0.0.0) и внешний адрес в ACHIEVEMENTS_IMAGE_URL.
+IMAGE_SERVER_PORT = os.environ.get("ACHIEVEMENTS_IMAGE_PORT")
+IMAGE_SERVER_HOST = os.environ.get("ACHIEVEMENTS_IMAGE_HOST", "127.0.0.1")
+IMAGE_BASE_URL = os.environ.get("ACHIEVEMENTS_IMAGE_URL") or (
+    f"http://localhost:{IMAGE_SERVER_PORT}/" if IMAGE_SERVER_PORT else "app/static/images/"
+)
+
+@st.cache_resource
+def get_image_server(host: str, port: int):
+    """Запускает сервер картинок один раз на процесс"""
+    return start_image_server(image_store, host=host, port=port)
+
+if IMAGE_SERVER_PORT:
+    get_image_server(IMAGE_SERVER_HOST, int(IMAGE_SERVER_PORT))
+
+def image_url(ref):
+    """Возвращает URL картинки из хранилища"""
+    return f"{IMAGE_BASE_URL}{ref}"
+
+# --- Журнал событий (получения и правки) для статистики и ленты ---
+@st.cache_resource
+def get_event_log():
+    """Один журнал на процесс: агрегаты в памяти общие для всех сессий"""
+    return EventLog(EVENTS_FILE)
+
+event_log = get_event_log()
+
+def log_event(kind, achievement_id, name, **fields):
+    """Пишет событие в журнал; ошибка журнала не должна мешать самому действию"""
+    try:
+        event_log.append(kind, achievement_id, name, **fields)
+    except Exception as e:
+        logger.error(f"Ошибка записи в журнал событий: {e}")
 
 # --- Централизованная функция для сохранения данных ---
-def save_data():
-    """Сохраняет данные в JSON файл с обработкой ошибок"""
+@perf.timed("save_data")
+def save_data(in_callback=False):
+    """Сохраняет изменившиеся достижения в хранилище с обработкой ошибок.
+
+    Если с прошлого сохранения ничего не менялось, хранилище не трогается.
+    in_callback=True — вызов из колбэка виджета: сообщения откладываются в toast.
+    """
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(achievements, f, ensure_ascii=False, indent=2)
+        achievements.flush(storage)
         return True
+    except ConflictError as e:
+        # Доска уже перечитана из хранилища (см. Achievements.flush)
+        logger.warning(f"Конфликт версий при сохранении: {e}")
+        message = f"Достижение '{e.name}' изменили в другой сессии. Данные обновлены, повторите действие."
+        if in_callback:
+            queue_toast(f"⚠️ {message}")
+        else:
+            st.warning(message)
+        return False
+    except BoardNotLoadedError as e:
+        logger.warning(f"Сохранение пропущено: {e}")
+        message = "Данные не загрузились, сохранение отключено. Изменения не сохранены."
+        if in_callback:
+            queue_toast(f"❌ {message}")
+        else:
+            st.error(message)
+        return False
     except Exception as e:
         logger.error(f"Ошибка при сохранении данных: {e}")
-        st.error("Не удалось сохранить данные. Проверьте права доступа к файлу.")
+        message = "Не удалось сохранить данные. Проверьте права доступа к файлу."
+        if in_callback:
+            queue_toast(f"❌ {message}")
+        else:
+            st.error(message)
         return False
 
-# --- Загрузка данных из JSON ---
-def load_data():
-    """Загружает данные из JSON файла с обработкой ошибок"""
-    if DATA_FILE.exists():
-        try:
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # Миграция данных: добавляем поле category для достижений, у которых его нет
-                for name, achievement in data.items():
-                    if "category" not in achievement:
-                        achievement["category"] = "General"  # Категория по умолчанию для старых достижений
-                    # Миграция данных: добавляем поле date_received для достижений, у которых его нет
-                    if "date_received" not in achievement:
-                        # Если достижение выполнено, устанавливаем дату получения как текущую дату
-                        # Если не выполнено, оставляем None
-                        achievement["date_received"] = None
-                        if achievement["done"]:
-                            from datetime import datetime
-                            achievement["date_received"] = datetime.now().strftime("%Y-%m-%d")
-                return data
-        except json.JSONDecodeError as e:
-            logger.error(f"Ошибка чтения JSON файла: {e}")
-            st.error("Файл данных поврежден. Используем стандартные достижения.")
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке данных: {e}")
-            st.error("Не удалось загрузить данные. Проверьте права доступа к файлу.")
-    
-    # Возвращаем стандартные достижения при ошибках
-    from datetime import datetime
+# --- Стандартные достижения для пустой доски ---
+def default_achievements():
     return {
-        "Run 10 km": {"done": False, "description": "Пробежал 10 километров за один раз.", "img_gray": None, "img_gold": None, "category": "Fitness", "date_received": None},
-        "Read 5 books": {"done": False, "description": "Прочитал 5 книг.", "img_gray": None, "img_gold": None, "category": "Learning", "date_received": None},
-        "Meditate 7 days": {"done": False, "description": "Медитировал 7 дней подряд.", "img_gray": None, "img_gold": None, "category": "Health", "date_received": None}
+        "Run 10 km": {"id": new_achievement_id(), "done": False, "description": "Пробежал 10 километров за один раз.", "img_gray": None, "img_gold": None, "category": "Fitness", "date_received": None},
+        "Read 5 books": {"id": new_achievement_id(), "done": False, "description": "Прочитал 5 книг.", "img_gray": None, "img_gold": None, "category": "Learning", "date_received": None},
+        "Meditate 7 days": {"id": new_achievement_id(), "done": False, "description": "Медитировал 7 дней подряд.", "img_gray": None, "img_gold": None, "category": "Health", "date_received": None}
     }
 
-achievements = load_data()
-
-# --- Base64 картинка с обработкой ошибок ---
-def img_to_base64(path: Path):
-    """Конвертирует изображение в Base64 с обработкой ошибок"""
+# --- Загрузка данных из хранилища ---
+@perf.timed("load_data")
+def load_data():
+    """Загружает данные из хранилища с обработкой ошибок"""
+    try:
+        # Версия схемы и данные читаются за один раз: в установившемся режиме это одно чтение без поправок
+        schema_version, data = storage.load_with_version()
+        if data is None:
+            # Данных еще нет — сохраняем стандартные достижения, чтобы дальше писать только изменения
+            data = Achievements(default_achievements())
+            data.revision = storage.save(data, schema_version=SCHEMA_VERSION)
+            return data
+        # Миграции выполняются один раз: после сохранения с новой версией схемы
+        # данные читаются как есть, без поправок отдельных записей
+        if migrate(data, schema_version, image_store):
+            data = Achievements(data)
+            data.revision = storage.save(data, schema_version=SCHEMA_VERSION)
+            return data
+        return Achievements(data)
+    except json.JSONDecodeError as e:
+        logger.error(f"Ошибка чтения JSON файла: {e}")
+        st.error("Файл данных поврежден. Используем стандартные достижения.")
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Ошибка чтения базы данных: {e}")
+        st.error("База данных повреждена. Используем стандартные достижения.")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке данных: {e}")
+        st.error("Не удалось загрузить данные. Проверьте права доступа к файлу.")
+    
+    # Возвращаем стандартные достижения при ошибках. Такую доску общий кеш не запоминает
+    # (см. LOAD_FAILED): хранилище перечитывается при следующем запуске
+    fallback = Achievements(default_achievements())
+    fallback.revision = LOAD_FAILED
+    return fallback
+
+# --- Общая для всех сессий копия данных ---
+@st.cache_resource
+def get_shared_achievements():
+    """Одна загруженная доска на процесс; перечитывается, только если хранилище изменилось извне"""
+    return SharedAchievements(storage, load_data)
+
+achievements = get_shared_achievements().get()
+
+# --- Кеш разметки карточек, общий для всех сессий ---
+@st.cache_resource
+def get_render_cache():
+    return RenderCache()
+
+render_cache = get_render_cache()
+
+# --- Стандартные картинки в хранилище с обработкой ошибок ---
+@st.cache_resource
+def default_image_ref(path: Path):
+    """Кладет стандартную картинку в хранилище (один раз на процесс) и возвращает ссылку"""
     try:
         if not path.exists():
             logger.warning(f"Изображение не найдено: {path}")
             return None
         
         with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
+            return image_store.put(f.read())
     except Exception as e:
         logger.error(f"Ошибка при чтении изображения {path}: {e}")
         return None
 
-# --- Инициализация session_state ---
-def init_session_state():
-    """Инициализирует session_state для всех достижений"""
-    for name in achievements.keys():
-        if name not in st.session_state:
-            st.session_state[name] = achievements[name]["done"]
-        if f"{name}_toast_shown" not in st.session_state:
-            st.session_state[f"{name}_toast_shown"] = achievements[name]["done"]
-        if f"{name}_show_popup" not in st.session_state:
-            st.session_state[f"{name}_show_popup"] = False
-        if f"{name}_show_edit" not in st.session_state:
-            st.session_state[f"{name}_show_edit"] = False
-        if f"{name}_show_delete" not in st.session_state:
-            st.session_state[f"{name}_show_delete"] = False
-
-init_session_state()
+# Состояние карточек в session_state создается лениво при отрисовке (см. ui_state.card_state)
+
+# --- Проверка версии (compare-and-swap) ---
+def is_stale(name, expected_version):
+    """True, если достижение изменили или удалили после того, как пользователь его увидел"""
+    return expected_version is not None and achievements.version(name) != expected_version
 
 # --- Колбэки для редактирования ---
-def show_edit_popup(name):
-    st.session_state[f"{name}_show_edit"] = True
+def show_edit_popup(achievement_id, version):
+    state = card_state(achievement_id)
+    state.show_edit = True
+    # Запоминаем версию, которую видел пользователь, открывая форму
+    state.edit_version = version
 
-def close_edit_popup(name):
-    st.session_state[f"{name}_show_edit"] = False
+def close_edit_popup(achievement_id):
+    card_state(achievement_id).show_edit = False
 
 # --- Колбэки для удаления ---
-def show_delete_popup(name):
-    st.session_state[f"{name}_show_delete"] = True
+def show_delete_popup(achievement_id, version):
+    state = card_state(achievement_id)
+    state.show_delete = True
+    state.delete_version = version
 
-def close_delete_popup(name):
-    st.session_state[f"{name}_show_delete"] = False
+def close_delete_popup(achievement_id):
+    card_state(achievement_id).show_delete = False
 
 # --- Функция для редактирования достижения ---
-def edit_achievement(name, new_name, new_desc, new_category, new_gray_file, new_gold_file, new_date=None):
-    """Редактирует достижение с валидацией"""
+def edit_achievement(name, new_name, new_desc, new_category, new_gray_file, new_gold_file, new_date=None, expected_version=None):
+    """Редактирует достижение с валидацией.
+
+    expected_version — версия, с которой пользователь открыл форму; если достижение
+    с тех пор изменили в другой сессии, изменения не применяются.
+    """
     # Проверка на пустое имя
     if not new_name.strip():
         st.error("Название достижения не может быть пустым.")
@@ -124,128 +272,174 @@ def edit_achievement(name, new_name, new_desc, new_category, new_gray_file, new_
     if not new_category.strip():
         new_category = "General"  # Категория по умолчанию если пользователь не ввел категорию
     
-    # Проверка на изменение имени и существование нового имени
-    if new_name != name and new_name in achievements:
-        st.error("Достижение с таким названием уже существует.")
-        return False
-    
     # Обработка изображений
-    img_gray_b64 = process_image_file(new_gray_file, "серого изображения")
-    img_gold_b64 = process_image_file(new_gold_file, "золотого изображения")
+    img_gray_ref = process_image_file(new_gray_file, "серого изображения")
+    img_gold_ref = process_image_file(new_gold_file, "золотого изображения")
     
-    # Сохраняем старое имя для очистки session_state
+    # Сохраняем старое имя
     old_name = name
     
-    # Обновляем достижение
-    achievements[new_name] = {
-        "done": achievements[old_name]["done"],
-        "description": new_desc,
-        "category": new_category,
-        "img_gray": img_gray_b64 if img_gray_b64 else achievements[old_name]["img_gray"],
-        "img_gold": img_gold_b64 if img_gold_b64 else achievements[old_name]["img_gold"],
-        "date_received": new_date if new_date is not None else achievements[old_name]["date_received"]
-    }
-    
-    # Удаляем старое достижение если имя изменилось
+    # Проверка и изменение под блокировкой, чтобы другая сессия не вклинилась между ними
+    with achievements.lock:
+        if is_stale(name, expected_version):
+            st.error("Достижение изменили или удалили в другой сессии. Откройте редактирование заново.")
+            if name in achievements:
+                close_edit_popup(achievements[name]["id"])
+            return False
+
+        # Проверка на изменение имени и существование нового имени
+        if new_name != name and new_name in achievements:
+            st.error("Достижение с таким названием уже существует.")
+            return False
+
+        return apply_edit(old_name, new_name, new_desc, new_category, img_gray_ref, img_gold_ref, new_date)
+
+def apply_edit(old_name, new_name, new_desc, new_category, img_gray_ref, img_gold_ref, new_date):
+    """Применяет проверенные изменения достижения и сохраняет их"""
+    # Переименование переносит ту же запись: id не меняется, поэтому состояние карточки в сессии сохраняется
     if new_name != old_name:
-        del achievements[old_name]
-        # Обновляем session_state
-        st.session_state[new_name] = st.session_state[old_name]
-        st.session_state[f"{new_name}_toast_shown"] = st.session_state[f"{old_name}_toast_shown"]
-        st.session_state[f"{new_name}_show_popup"] = st.session_state[f"{old_name}_show_popup"]
-        # Удаляем старые session_state переменные
-        del st.session_state[old_name]
-        del st.session_state[f"{old_name}_toast_shown"]
-        del st.session_state[f"{old_name}_show_popup"]
-        del st.session_state[f"{old_name}_show_edit"]
-        del st.session_state[f"{old_name}_show_delete"]
+        achievements.rename(old_name, new_name)
+    
+    # Обновляем поля достижения
+    achievement = achievements[new_name]
+    achievement["description"] = new_desc
+    achievement["category"] = new_category
+    if img_gray_ref:
+        achievement["img_gray"] = img_gray_ref
+    if img_gold_ref:
+        achievement["img_gold"] = img_gold_ref
+    if new_date is not None:
+        achievement["date_received"] = new_date
+    achievements.mark_changed(new_name)
     
     # Сохраняем данные
     if save_data():
-        st.success(f"Achievement '{new_name}' updated successfully!")
+        log_event(EDIT, achievement["id"], new_name, category=achievement["category"],
+                  old_name=old_name if new_name != old_name else None)
+        flash(f"Achievement '{new_name}' updated successfully!")
         return True
     return False
 
 # --- Функция для удаления достижения ---
-def delete_achievement(name):
-    """Удаляет достижение с очисткой session_state"""
+def delete_achievement(name, expected_version=None):
+    """Удаляет достижение с очисткой session_state.
+
+    Если после открытия подтверждения достижение изменили в другой сессии, удаление отменяется.
+    """
+    with achievements.lock:
+        if name in achievements and is_stale(name, expected_version):
+            st.error("Достижение изменили в другой сессии. Проверьте его и подтвердите удаление заново.")
+            close_delete_popup(achievements[name]["id"])
+            return False
+        return apply_delete(name)
+
+def apply_delete(name):
+    """Удаляет достижение из данных и session_state и сохраняет изменения"""
     if name in achievements:
-        # Удаляем из данных
+        # Очищаем session_state и удаляем из данных
+        achievement_id = achievements[name]["id"]
+        drop_card_state(achievement_id)
         del achievements[name]
-        # Очищаем session_state
-        if name in st.session_state:
-            del st.session_state[name]
-        if f"{name}_toast_shown" in st.session_state:
-            del st.session_state[f"{name}_toast_shown"]
-        if f"{name}_show_popup" in st.session_state:
-            del st.session_state[f"{name}_show_popup"]
-        if f"{name}_show_edit" in st.session_state:
-            del st.session_state[f"{name}_show_edit"]
-        if f"{name}_show_delete" in st.session_state:
-            del st.session_state[f"{name}_show_delete"]
         
         # Сохраняем данные
         if save_data():
-            st.success(f"Achievement '{name}' deleted successfully!")
+            log_event(DELETE, achievement_id, name)
+            flash(f"Achievement '{name}' deleted successfully!")
             return True
     return False
 
 # --- Чекбокс + toast ---
-def on_checkbox_change(name):
+def on_checkbox_change(name, achievement_id, expected_version=None):
     """Обработчик изменения состояния чекбокса"""
-    if st.session_state[name] and not st.session_state[f"{name}_toast_shown"]:
-        st.toast(f"🏆 Achievement unlocked: {name}")
-        st.session_state[f"{name}_toast_shown"] = True
-        # Сохраняем прогресс
-        achievements[name]["done"] = True
-        # Устанавливаем дату получения, если она еще не установлена
-        if not achievements[name].get("date_received"):
+    with achievements.lock:
+        if name not in achievements:
+            # Достижение удалили в другой сессии
+            return
+        if is_stale(name, expected_version):
+            # Статус успели поменять в другой сессии — показываем актуальный вместо перезаписи
+            st.session_state[done_key(achievement_id)] = achievements[name]["done"]
+            queue_toast(f"Достижение '{name}' изменили в другой сессии, статус обновлен.")
+            return
+        apply_checkbox(name, achievement_id)
+
+def apply_checkbox(name, achievement_id):
+    """Переносит статус чекбокса в данные и сохраняет его"""
+    done = st.session_state[done_key(achievement_id)]
+    state = card_state(achievement_id)
+    if done and not state.toast_shown:
+        queue_toast(f"🏆 Achievement unlocked: {name}")
+        state.toast_shown = True
+    # Сохраняем прогресс сразу, чтобы его увидели остальные сессии
+    if achievements[name]["done"] != done:
+        previous_version = achievements.version(name)
+        # Устанавливаем дату получения, если она еще не установлена. Получением в журнале
+        # считается только это первое отмечание: повторная отметка после снятия — не новое получение
+        first_unlock = done and not achievements[name].get("date_received")
+        if first_unlock:
             from datetime import datetime
             achievements[name]["date_received"] = datetime.now().strftime("%Y-%m-%d")
-        save_data()
+        achievements[name]["done"] = done
+        achievements.mark_changed(name)
+        if save_data(in_callback=True):
+            if first_unlock or not done:
+                log_event(UNLOCK if done else LOCK, achievement_id, name, category=achievements[name]["category"])
+            # Открытые формы этой сессии не должны считать ее же чекбокс чужим изменением;
+            # формы, открытые до изменения из другой сессии, остаются устаревшими
+            if state.edit_version == previous_version:
+                state.edit_version = achievements.version(name)
+            if state.delete_version == previous_version:
+                state.delete_version = achievements.version(name)
 
 # --- Колбэки для pop-up ---
-def show_popup(name):
-    st.session_state[f"{name}_show_popup"] = True
+def show_popup(achievement_id):
+    card_state(achievement_id).show_popup = True
 
-def close_popup(name):
-    st.session_state[f"{name}_show_popup"] = False
+def close_popup(achievement_id):
+    card_state(achievement_id).show_popup = False
 
-# --- Функция для валидации и конвертации изображений ---
+# --- Функция для валидации и сохранения изображений ---
 def process_image_file(uploaded_file, image_type):
-    """Обрабатывает загруженный файл изображения"""
+    """Обрабатывает загруженный файл изображения и возвращает ссылку на него в хранилище"""
     if not uploaded_file:
         return None
     
     try:
-        # Проверяем размер файла (не более 5MB)
-        if uploaded_file.size > 5 * 1024 * 1024:
-            st.warning(f"Файл {image_type} слишком большой. Максимальный размер: 5MB")
-            return None
-        
-        # Читаем и конвертируем в Base64
-        image_data = uploaded_file.read()
-        if not image_data:
-            st.warning(f"Файл {image_type} пустой или поврежден.")
-            return None
-        
-        return base64.b64encode(image_data).decode()
+        # Загрузка не копируется целиком: формат и размеры проверяются по заголовку,
+        # затем картинка декодируется один раз и кладется в хранилище с уменьшенными копиями
+        return image_store.ingest_stream(uploaded_file)
     
+    except ImageTooLargeError as e:
+        logger.warning(f"Файл {image_type} отклонен: {e}")
+        st.warning(f"Файл {image_type} слишком большой. Максимальный размер: "
+                   f"{MAX_UPLOAD_MB}MB, {MAX_DIMENSION}x{MAX_DIMENSION} и не больше "
+                   f"{MAX_PIXELS // 1_000_000} млн пикселей")
+        return None
+
+    except InvalidImageError as e:
+        logger.warning(f"Файл {image_type} не является изображением: {e}")
+        st.warning(f"Файл {image_type} не является изображением или поврежден.")
+        return None
+
     except Exception as e:
         logger.error(f"Ошибка при обработке изображения {image_type}: {e}")
         st.error(f"Ошибка при обработке изображения {image_type}. Пожалуйста, загрузите файл заново.")
         return None
 
 # --- Создание новой ачивки в боковой панели ---
+# Доска со стандартными достижениями вместо незагрузившихся данных только для просмотра
+saving_disabled = achievements.revision is LOAD_FAILED
+
 with st.sidebar:
+    if saving_disabled:
+        st.warning("Данные не удалось загрузить: показаны стандартные достижения, сохранение отключено.")
     st.header("➕ Add New Achievement")
     new_name = st.text_input("Title")
     new_desc = st.text_area("Description")
     new_category = st.text_input("Category", value="General")
-    gray_file = st.file_uploader("Upload gray (not done) image", type=["png","jpg","jpeg"])
-    gold_file = st.file_uploader("Upload gold (done) image", type=["png","jpg","jpeg"])
+    gray_file = st.file_uploader("Upload gray (not done) image", type=["png","jpg","jpeg"], max_upload_size=MAX_UPLOAD_MB)
+    gold_file = st.file_uploader("Upload gold (done) image", type=["png","jpg","jpeg"], max_upload_size=MAX_UPLOAD_MB)
     
-    if st.button("Create Achievement"):
+    if st.button("Create Achievement", disabled=saving_disabled):
         # Валидация ввода
         if not new_name.strip():
             st.error("Название достижения не может быть пустым.")
@@ -253,158 +447,241 @@ with st.sidebar:
             st.error("Достижение с таким названием уже существует.")
         else:
             # Обработка изображений
-            img_gray_b64 = process_image_file(gray_file, "серого изображения")
-            img_gold_b64 = process_image_file(gold_file, "золотого изображения")
+            img_gray_ref = process_image_file(gray_file, "серого изображения")
+            img_gold_ref = process_image_file(gold_file, "золотого изображения")
             
             # Создаем новое достижение
             achievements[new_name] = {
+                "id": new_achievement_id(),
                 "done": False,
                 "description": new_desc,
                 "category": new_category if new_category.strip() else "General",
-                "img_gray": img_gray_b64,
-                "img_gold": img_gold_b64,
+                "img_gray": img_gray_ref,
+                "img_gold": img_gold_ref,
                 "date_received": None
             }
             
-            # Инициализация session_state для нового достижения
-            st.session_state[new_name] = False
-            st.session_state[f"{new_name}_toast_shown"] = False
-            st.session_state[f"{new_name}_show_popup"] = False
-            
             # Сохраняем данные
             if save_data():
+                log_event(CREATE, achievements[new_name]["id"], new_name, category=achievements[new_name]["category"])
                 st.success(f"Achievement '{new_name}' added!")
 
+# --- Массовый импорт и экспорт (см. archive.py) ---
+def build_export():
+    """Собирает архив во временном файле; Streamlit вызывает ее только по нажатию кнопки"""
+    target = tempfile.TemporaryFile()
+    export_archive(storage, image_store, target)
+    target.seek(0)
+    return target
+
+with st.sidebar:
+    st.header("📦 Import / Export")
+    st.download_button("Export archive", data=build_export, file_name="achievements.zip", mime="application/zip")
+    archive_file = st.file_uploader("Import archive", type=["zip"], key="import_archive")
+    if archive_file and st.button("Import"):
+        try:
+            # Архив пишется в хранилище одной транзакцией; доска перечитается при перезапуске
+            imported = import_archive(archive_file, storage, image_store)
+        except ArchiveError as e:
+            logger.error(f"Ошибка импорта архива: {e}")
+            st.error(f"Не удалось импортировать архив: {e}")
+        except Exception as e:
+            logger.error(f"Ошибка импорта архива: {e}")
+            st.error("Не удалось импортировать архив. Проверьте права доступа к файлу.")
+        else:
+            flash(f"Imported {imported} achievements.")
+            st.rerun()
+
 # --- Сетка 5xN с отступами между рядами ---
 cols_per_row = 5
 row_margin = 10  # ????????? ?? ?????????? ????????
 
-# --- ??????????? ?????????? ?? ?????????? ---
+# --- Постраничный вывод ---
+# Рендерится только видимая страница каждой категории; свернутые категории не создают виджетов карточек
+MAX_PAGE_SIZE = 500
+DEFAULT_EXPANDED_CATEGORIES = 3  # сколько первых категорий доски раскрыто при открытии страницы
 
-def render_achievement(name):
+def default_page_size():
+    """Размер страницы из ACHIEVEMENTS_PAGE_SIZE, приведенный к допустимому диапазону"""
     try:
-        # ???????? ????????: Base64 ?? JSON ??? ?????????
-        if achievements[name]["img_gray"] and achievements[name]["img_gold"]:
-            img_base64 = achievements[name]["img_gold"] if st.session_state[name] else achievements[name]["img_gray"]
-        else:
-            # ?????????? ????????? ???????????
-            default_img_path = GOLD_IMG if st.session_state[name] else GRAY_IMG
-            img_base64 = img_to_base64(default_img_path)
+        size = int(os.environ.get("ACHIEVEMENTS_PAGE_SIZE", 20))
+    except ValueError:
+        logger.warning("ACHIEVEMENTS_PAGE_SIZE должен быть целым числом, используем 20")
+        return 20
+    return min(max(size, cols_per_row), MAX_PAGE_SIZE)
+
+DEFAULT_PAGE_SIZE = default_page_size()
+
+with st.sidebar:
+    st.header("⚙️ Display")
+    page_size = st.number_input(
+        "Achievements per page",
+        min_value=cols_per_row,
+        max_value=MAX_PAGE_SIZE,
+        value=DEFAULT_PAGE_SIZE,
+        step=cols_per_row,
+        key="page_size",
+    )
+
+def set_page(category, page):
+    st.session_state[f"page_{category}"] = page
 
-            # ???? ????????? ??????????? ??????????, ?????????? ????????
-            if not img_base64:
-                img_base64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="  # ?????? ???????????
+# --- ??????????? ?????????? ?? ?????????? ---
 
-        # ??????: ????? ??? ???? ?????????
+def build_card_markup(name, achievement):
+    """Собирает HTML карточки и ее pop-up; результат кешируется в render_cache"""
+    done = achievement["done"]
+    # ???????? ????????: Base64 ?? JSON ??? ?????????
+    img_ref = None
+    if achievement["img_gray"] and achievement["img_gold"]:
+        img_ref = achievement["img_gold"] if done else achievement["img_gray"]
+    if not image_store.exists(img_ref):
+        # ?????????? ????????? ???????????
+        img_ref = default_image_ref(GOLD_IMG if done else GRAY_IMG)
+
+    if img_ref:
+        # Отдаем картинку по URL: имя файла — хеш содержимого, браузер кеширует ее между перезапусками.
+        # Карточке и pop-up достаются уменьшенные копии нужного размера
+        img_src = image_url(image_store.variant(img_ref, "card"))
+        popup_img_src = image_url(image_store.variant(img_ref, "popup"))
+    else:
+        # ???? ????????? ??????????? ??????????, ?????????? ????????
+        img_src = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="  # ?????? ???????????
+        popup_img_src = img_src
+
+    # ??????: ????? ??? ???? ?????????
+    date_text = ""
+    if achievement["done"] and achievement.get("date_received"):
+        date_text = f'<span style="color:#aaaaaa; font-size:12px;">Date received: {achievement["date_received"]}</span>'
+    elif achievement["done"] and not achievement.get("date_received"):
+        date_text = '<span style="color:#aaaaaa; font-size:12px;">Date received: Not set</span>'
+    else:
         date_text = ""
-        if achievements[name]["done"] and achievements[name].get("date_received"):
-            date_text = f'<span style="color:#aaaaaa; font-size:12px;">Date received: {achievements[name]["date_received"]}</span>'
-        elif achievements[name]["done"] and not achievements[name].get("date_received"):
-            date_text = '<span style="color:#aaaaaa; font-size:12px;">Date received: Not set</span>'
-        else:
-            date_text = ""
-
-        # ??????????? ????????? ? ???? ? ????? ????????
-        info_text = f'<span style="color:#cccccc; font-size:14px;">Category: {achievements[name]["category"]}</span>'
-        if date_text:
-            info_text += f'<br>{date_text}'
-
-        st.markdown(
-            f"""
-            <div style="
-                display:flex;
-                align-items:center;
-                background-color:#2C2C2C;
-                border-radius:12px;
-                padding:15px 20px;
-                width:100%;
-                height:120px;
-                margin-bottom:5px;
-            ">
-                <img src="data:image/png;base64,{img_base64}" style="width:90px; height:90px; margin-right:20px;" />
-                <div style='flex:1; display:flex; flex-direction:column; justify-content:center;'>
-                    <span style='color:white; font-size:22px; font-weight:bold;'>{name}</span>
-                    {info_text}
-                </div>
+
+    # ??????????? ????????? ? ???? ? ????? ????????
+    info_text = f'<span style="color:#cccccc; font-size:14px;">Category: {achievement["category"]}</span>'
+    if date_text:
+        info_text += f'<br>{date_text}'
+
+    card_html = f"""
+        <div style="
+            display:flex;
+            align-items:center;
+            background-color:#2C2C2C;
+            border-radius:12px;
+            padding:15px 20px;
+            width:100%;
+            height:120px;
+            margin-bottom:5px;
+        ">
+            <img src="{img_src}" style="width:90px; height:90px; margin-right:20px;" />
+            <div style='flex:1; display:flex; flex-direction:column; justify-content:center;'>
+                <span style='color:white; font-size:22px; font-weight:bold;'>{name}</span>
+                {info_text}
             </div>
-            """,
-            unsafe_allow_html=True
+        </div>
+        """
+
+    popup_html = f"""
+        <div style="
+            background-color:#3C3C3C;
+            padding:20px;
+            border-radius:15px;
+            margin-top:10px;
+            text-align:center;
+        ">
+            <img src="{popup_img_src}" style="width:200px; height:200px; margin-bottom:15px;" />
+            <h2 style="color:white;">{name}</h2>
+            <p style="color:white;">{achievement["description"]}</p>
+        </div>
+        """
+    return card_html, popup_html
+
+@perf.timed("render_achievement")
+def render_achievement(name):
+    try:
+        # Снимок записи: другая сессия может изменить ее, пока карточка рисуется
+        with achievements.lock:
+            achievement = dict(achievements[name])
+        achievement_id = achievement["id"]
+        done = achievement["done"]
+        state = card_state(achievement_id, done)
+        # Доска общая для всех сессий: статус мог поменяться в другой вкладке
+        if st.session_state.get(done_key(achievement_id)) != done:
+            st.session_state[done_key(achievement_id)] = done
+
+        # Разметка собирается только для новой или изменившейся карточки:
+        # ключ составлен из полей, которые в нее попадают
+        card_html, popup_html = render_cache.get(
+            markup_key(name, achievement), lambda: build_card_markup(name, achievement)
         )
+        st.markdown(card_html, unsafe_allow_html=True)
 
         # ??????? + Details + Edit + Delete
         cols_inner = st.columns([1,1,1,1])
         with cols_inner[0]:
-            st.checkbox(label="Done", key=name, on_change=on_checkbox_change, args=(name,))
+            st.checkbox(label="Done", key=done_key(achievement_id), on_change=on_checkbox_change,
+                        args=(name, achievement_id, achievement.get("version", 0)))
         with cols_inner[1]:
-            st.button("Details", key=f"details_{name}", on_click=show_popup, args=(name,))
+            st.button("Details", key=f"details_{achievement_id}", on_click=show_popup, args=(achievement_id,))
         with cols_inner[2]:
-            st.button("Edit", key=f"edit_{name}", on_click=show_edit_popup, args=(name,))
+            st.button("Edit", key=f"edit_{achievement_id}", on_click=show_edit_popup,
+                      args=(achievement_id, achievement.get("version", 0)))
         with cols_inner[3]:
-            st.button("Delete", key=f"delete_{name}", on_click=show_delete_popup, args=(name,))
+            st.button("Delete", key=f"delete_{achievement_id}", on_click=show_delete_popup,
+                      args=(achievement_id, achievement.get("version", 0)))
 
         # Pop-up
-        if st.session_state.get(f"{name}_show_popup", False):
-            st.markdown(
-                f"""
-                <div style="
-                    background-color:#3C3C3C;
-                    padding:20px;
-                    border-radius:15px;
-                    margin-top:10px;
-                    text-align:center;
-                ">
-                    <img src="data:image/png;base64,{img_base64}" style="width:200px; height:200px; margin-bottom:15px;" />
-                    <h2 style="color:white;">{name}</h2>
-                    <p style="color:white;">{achievements[name]["description"]}</p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            st.button("Close", key=f"close_{name}", on_click=close_popup, args=(name,))
+        if state.show_popup:
+            st.markdown(popup_html, unsafe_allow_html=True)
+            st.button("Close", key=f"close_{achievement_id}", on_click=close_popup, args=(achievement_id,))
 
         # Edit Modal
-        if st.session_state.get(f"{name}_show_edit", False):
+        if state.show_edit:
             with st.expander(f"?? Edit Achievement: {name}", expanded=True):
                 # ????? ??????????????
-                edit_name = st.text_input("Title", value=name, key=f"edit_name_{name}")
-                edit_desc = st.text_area("Description", value=achievements[name]["description"], key=f"edit_desc_{name}")
-                edit_category = st.text_input("Category", value=achievements[name]["category"], key=f"edit_category_{name}")
-                edit_gray_file = st.file_uploader("Upload new gray (not done) image", type=["png","jpg","jpeg"], key=f"edit_gray_{name}")
-                edit_gold_file = st.file_uploader("Upload new gold (done) image", type=["png","jpg","jpeg"], key=f"edit_gold_{name}")
+                edit_name = st.text_input("Title", value=name, key=f"edit_name_{achievement_id}")
+                edit_desc = st.text_area("Description", value=achievement["description"], key=f"edit_desc_{achievement_id}")
+                edit_category = st.text_input("Category", value=achievement["category"], key=f"edit_category_{achievement_id}")
+                edit_gray_file = st.file_uploader("Upload new gray (not done) image", type=["png","jpg","jpeg"], max_upload_size=MAX_UPLOAD_MB, key=f"edit_gray_{achievement_id}")
+                edit_gold_file = st.file_uploader("Upload new gold (done) image", type=["png","jpg","jpeg"], max_upload_size=MAX_UPLOAD_MB, key=f"edit_gold_{achievement_id}")
 
                 # ???? ??? ?????????????? ???? ?????????
-                current_date = achievements[name].get("date_received")
+                current_date = achievement.get("date_received")
                 if current_date:
                     from datetime import datetime
                     current_date_obj = datetime.strptime(current_date, "%Y-%m-%d").date()
                 else:
                     current_date_obj = None
 
-                new_date = st.date_input("Date received", value=current_date_obj, key=f"edit_date_{name}")
+                new_date = st.date_input("Date received", value=current_date_obj, key=f"edit_date_{achievement_id}")
 
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("Save Changes", key=f"save_edit_{name}"):
+                    if st.button("Save Changes", key=f"save_edit_{achievement_id}"):
                         # ??????????? ???? ? ?????? ??????? YYYY-MM-DD
                         date_str = new_date.strftime("%Y-%m-%d") if new_date else None
-                        if edit_achievement(name, edit_name, edit_desc, edit_category, edit_gray_file, edit_gold_file, date_str):
-                            close_edit_popup(name)
+                        if edit_achievement(name, edit_name, edit_desc, edit_category, edit_gray_file, edit_gold_file, date_str,
+                                            state.edit_version):
+                            close_edit_popup(achievement_id)
+                            # Название или категория могли поменяться — перестраиваем всю доску
+                            st.rerun()
                 with col2:
-                    st.button("Cancel", key=f"cancel_edit_{name}", on_click=close_edit_popup, args=(name,))
+                    st.button("Cancel", key=f"cancel_edit_{achievement_id}", on_click=close_edit_popup, args=(achievement_id,))
 
         # Delete Modal
-        if st.session_state.get(f"{name}_show_delete", False):
+        if state.show_delete:
             with st.expander(f"??? Delete Achievement: {name}", expanded=True):
                 st.warning(f"Are you sure you want to delete '{name}'?")
                 st.error("This action cannot be undone.")
 
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("Yes, Delete", key=f"confirm_delete_{name}"):
-                        if delete_achievement(name):
-                            close_delete_popup(name)
+                    if st.button("Yes, Delete", key=f"confirm_delete_{achievement_id}"):
+                        if delete_achievement(name, state.delete_version):
+                            st.rerun()
                 with col2:
-                    st.button("Cancel", key=f"cancel_delete_{name}", on_click=close_delete_popup, args=(name,))
+                    st.button("Cancel", key=f"cancel_delete_{achievement_id}", on_click=close_delete_popup, args=(achievement_id,))
 
     except Exception as e:
         logger.error(f"?????? ??? ??????????? ?????????? {name}: {e}")
@@ -412,28 +689,116 @@ def render_achievement(name):
         pass
 
 
-category_to_achievements = {}
-for name in achievements.keys():
-    category = achievements[name].get("category") or "General"
-    category = category.strip() if isinstance(category, str) else "General"
-    if not category:
-        category = "General"
-    category_to_achievements.setdefault(category, []).append(name)
-
-sorted_categories = sorted(category_to_achievements.keys(), key=str.lower)
+# --- Поиск, фильтры и сортировка ---
+# Группировка по категориям берется из индекса общей доски, который обновляется
+# при создании, изменении и удалении достижений, а не пересчитывается на каждом запуске
+STATUS_FILTERS = {"All": None, "Done": True, "Not done": False}
+SORT_OPTIONS = {"Board order": SORT_DEFAULT, "Newest first": SORT_NEWEST, "Oldest first": SORT_OLDEST}
 
-for category in sorted_categories:
-    st.subheader(category)
+with st.sidebar:
+    st.header("🔎 Search & Filter")
+    search_text = st.text_input("Search by title or description", key="search_text")
+    selected_categories = st.multiselect("Categories", achievements.index.categories(), key="filter_categories")
+    status_filter = st.selectbox("Status", list(STATUS_FILTERS), key="filter_status")
+    date_range = st.date_input("Date received between", value=(), key="filter_dates")
+    sort_label = st.selectbox("Sort by date received", list(SORT_OPTIONS), key="sort_order")
+
+# date_input с диапазоном возвращает 0, 1 или 2 даты, пока пользователь выбирает
+date_from = date_range[0].strftime("%Y-%m-%d") if len(date_range) > 0 else None
+date_to = date_range[1].strftime("%Y-%m-%d") if len(date_range) > 1 else date_from
+
+with perf.timed("grouping"):
+    category_to_achievements = achievements.index.query(
+        text=search_text,
+        categories=set(selected_categories),
+        done=STATUS_FILTERS[status_filter],
+        date_from=date_from,
+        date_to=date_to,
+        sort=SORT_OPTIONS[sort_label],
+    )
+
+sorted_categories = list(category_to_achievements)
+
+# --- Статистика и лента событий ---
+# Все цифры берутся из готовых агрегатов (журнал событий и счетчики индекса), без прохода по доске
+EVENT_LABELS = {
+    UNLOCK: "🏆 Unlocked",
+    LOCK: "↩️ Marked not done",
+    CREATE: "➕ Created",
+    EDIT: "✏️ Edited",
+    DELETE: "🗑️ Deleted",
+}
+TIMELINE_EVENTS = 20
+STATS_DAYS = 30
+
+@perf.timed("stats")
+def render_stats():
+    stats = event_log.refresh()
+    completion = achievements.index.completion()
+    done_total = sum(done for done, _ in completion.values())
+    total = sum(count for _, count in completion.values())
+    with st.expander("📈 Stats & Timeline"):
+        cols = st.columns(4)
+        cols[0].metric("Completed", f"{done_total}/{total}")
+        cols[1].metric("Current streak", f"{stats.current_streak()} d")
+        cols[2].metric("Longest streak", f"{stats.longest_streak} d")
+        cols[3].metric("Unlocks logged", stats.counts.get(UNLOCK, 0))
+
+        per_day = stats.unlocks_last_days(STATS_DAYS)
+        st.caption(f"Unlocks over the last {STATS_DAYS} days")
+        st.bar_chart({"day": list(per_day), "unlocks": list(per_day.values())}, x="day", y="unlocks")
+
+        st.caption("Completion by category")
+        st.table([
+            {"Category": category, "Done": done, "Total": count, "Progress": f"{done / count:.0%}"}
+            for category, (done, count) in completion.items()
+        ])
+
+        st.caption("Recent activity")
+        recent = list(stats.recent)[-TIMELINE_EVENTS:]
+        if not recent:
+            st.write("No activity yet.")
+        for event in reversed(recent):
+            label = EVENT_LABELS.get(event["type"], event["type"])
+            renamed = f" (was '{event['old_name']}')" if event.get("old_name") else ""
+            st.markdown(f"`{event['ts'].replace('T', ' ')}` {label} **{event['name']}**{renamed}")
+
+render_stats()
+
+if not sorted_categories:
+    st.info("No achievements match the current filters.")
+
+# --- Карточка как отдельный фрагмент ---
+# Чекбокс, Details, Edit и Delete перезапускают только свою карточку, а не весь скрипт.
+# Сохранение идет прямо в колбэках, поэтому не зависит от save_all_progress в конце скрипта.
+@st.fragment
+def achievement_fragment(name):
+    # При перезапуске одного фрагмента скрипт уже завершен (script_running сброшен в конце),
+    # поэтому такой запуск замеряется отдельно
+    fragment_rerun = not script_running
+    if fragment_rerun:
+        perf.begin_run(perf.FRAGMENT)
+    try:
+        show_queued_toasts()
+        render_achievement(name)
+    finally:
+        if fragment_rerun:
+            run = perf.end_run()
+            if run is not None:
+                st.session_state["_perf_last_fragment"] = {"name": name, **run}
+
+def render_grid(names):
+    """Выводит карточки сеткой по cols_per_row в ряд"""
     col_index = 0
     cols = st.columns(cols_per_row)
 
     # ????????? ????????? ?????? ????? ?????? ?????, ????? ??? ???? ???? ????????????
     st.markdown(f"<div style='margin-bottom:{row_margin}px;'></div>", unsafe_allow_html=True)
 
-    for name in category_to_achievements[category]:
+    for name in names:
         col = cols[col_index]
         with col:
-            render_achievement(name)
+            achievement_fragment(name)
 
         col_index += 1
         if col_index >= cols_per_row:
@@ -441,14 +806,101 @@ for category in sorted_categories:
             cols = st.columns(cols_per_row)
             st.markdown(f"<div style='margin-bottom:{row_margin}px;'></div>", unsafe_allow_html=True)
 
+def render_pager(category, page, pages):
+    """Кнопки переключения страниц категории"""
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("‹ Prev", key=f"prev_{category}", disabled=page == 0,
+                  on_click=set_page, args=(category, page - 1))
+    with info_col:
+        st.caption(f"Page {page + 1} of {pages}")
+    with next_col:
+        st.button("Next ›", key=f"next_{category}", disabled=page >= pages - 1,
+                  on_click=set_page, args=(category, page + 1))
+
+# Раскрытие категорий хранится отдельно от виджетов: состояние виджета Streamlit удаляет,
+# как только категория пропадает из выдачи, а выбор пользователя должен это пережить
+EXPANDED_KEY = "expanded_categories"
+
+def remember_expanded(category):
+    st.session_state.setdefault(EXPANDED_KEY, {})[category] = st.session_state[f"expand_{category}"]
+
+def render_category(category, names, expanded_by_default, filtering):
+    """Выводит заголовок категории и, если она раскрыта, только текущую страницу карточек.
+
+    Пока активен поиск или фильтр, все категории с совпадениями раскрыты.
+    """
+    header_col, toggle_col = st.columns([6, 1])
+    with header_col:
+        st.subheader(category)
+    with toggle_col:
+        if filtering:
+            expanded = True
+            st.caption(f"{len(names)} found")
+        else:
+            expanded = st.toggle(
+                "Show",
+                value=st.session_state.get(EXPANDED_KEY, {}).get(category, expanded_by_default),
+                key=f"expand_{category}",
+                on_change=remember_expanded,
+                args=(category,),
+            )
+
+    if not expanded:
+        st.caption(f"{len(names)} achievements hidden")
+        return
+
+    pages = max(1, math.ceil(len(names) / page_size))
+    # Страница могла исчезнуть после удаления достижений
+    page = min(st.session_state.get(f"page_{category}", 0), pages - 1)
+    render_grid(names[page * page_size:(page + 1) * page_size])
+    if pages > 1:
+        render_pager(category, page, pages)
+
+# По умолчанию раскрыты первые категории всей доски, а не текущей выдачи:
+# иначе раскрытие категории зависело бы от того, что отфильтровано
+expanded_by_default = set(achievements.index.categories()[:DEFAULT_EXPANDED_CATEGORIES])
+filtering = bool(search_text.strip() or selected_categories or STATUS_FILTERS[status_filter] is not None or date_from)
+
+for category in sorted_categories:
+    render_category(category, category_to_achievements[category], category in expanded_by_default, filtering)
+
 def save_all_progress():
     """Сохраняет прогресс всех достижений"""
-    # Создаем копию ключей, чтобы избежать изменения словаря во время итерации
-    achievement_names = list(achievements.keys())
-    for name in achievement_names:
-        if name in achievements:  # Проверяем, что достижение еще существует
-            achievements[name]["done"] = st.session_state[name]
+    # Статус чекбоксов уже перенесен в общую доску в on_checkbox_change.
+    # Пишем только изменившиеся достижения; если изменений нет, запись пропускается
     save_data()
+    logger.debug(f"Статистика сохранений: {save_stats}")
 
 # Автоматическое сохранение при завершении работы
-save_all_progress()
\ No newline at end of file
+save_all_progress()
+
+# --- Панель производительности ---
+# Скрыта: видна только с включенными замерами и параметром ?debug=1 в адресе
+if perf.enabled and st.query_params.get("debug") == "1":
+    with st.sidebar.expander("🛠 Performance", expanded=True):
+        run_timers = perf.last_run_timers()
+        st.caption("This rerun")
+        st.table([
+            {"timer": name, "calls": calls, "ms": round(total * 1000, 2)}
+            for name, (calls, total) in sorted(run_timers.items(), key=lambda item: -item[1][1])
+        ])
+        last_fragment = st.session_state.get("_perf_last_fragment")
+        if last_fragment:
+            st.caption(f"Last card rerun: {last_fragment['name']} ({last_fragment['total_ms']} ms)")
+            st.table([
+                {"timer": name, "calls": timer["calls"], "ms": timer["ms"]}
+                for name, timer in last_fragment["timers"].items()
+            ])
+        process_timers, counters = perf.snapshot()
+        st.caption("Since process start")
+        st.table([
+            {"timer": name, "calls": calls, "avg ms": round(total / calls * 1000, 2), "max ms": round(slowest * 1000, 2)}
+            for name, (calls, total, slowest) in sorted(process_timers.items())
+        ])
+        st.json({**counters, **save_stats, "render_cache_hits": render_cache.hits, "render_cache_misses": render_cache.misses})
+        st.code(perf.prometheus_text({**save_stats, "render_cache_hits": render_cache.hits,
+                                      "render_cache_misses": render_cache.misses}), language="text")
+
+script_running = False
+perf.end_run()
\ No newline at end of file
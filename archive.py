@@ -0,0 +1,233 @@
+"""Массовый импорт и экспорт достижений.
+
+Архив — обычный ZIP:
+
+* ``manifest.json`` — ``{"format": 1, "schema_version": N}``;
+* ``achievements.ndjson`` — по одной записи на строку: ``{"name": ..., <поля записи>}``;
+* ``images/<ссылка>`` — файлы картинок, на которые ссылаются записи.
+
+И экспорт, и импорт идут потоком: записи читаются и пишутся по одной строке,
+картинки копируются по частям, поэтому размер архива на память не влияет.
+Импорт проверяет записи и пишет их пачками в одной транзакции хранилища
+(см. storage.import_records): либо импортируется весь архив, либо ничего.
+
+Запуск из командной строки::
+
+    python archive.py export backup.zip
+    python archive.py import backup.zip
+"""
+from pathlib import Path
+import argparse
+import io
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+
+from image_store import ImageStore, InvalidImageError, is_image_ref, open_checked
+from migrations import SCHEMA_VERSION, import_migration, migrate
+from storage import FIELDS, IMPORT_BATCH_SIZE, open_storage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 1
+MANIFEST = "manifest.json"
+RECORDS = "achievements.ndjson"
+IMAGES_DIR = "images/"
+IMAGE_FIELDS = ("img_gray", "img_gold")
+
+# Картинки в архиве больше этого размера не принимаются
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class ArchiveError(ValueError):
+    """Архив поврежден или содержит некорректные данные"""
+
+
+def export_archive(storage, image_store, target):
+    """Пишет все достижения и их картинки в ZIP-архив target (путь или файловый объект).
+
+    Возвращает число выгруженных достижений.
+    """
+    count = 0
+    # Словарь как упорядоченное множество ссылок на картинки
+    images = {}
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        manifest = {"format": ARCHIVE_FORMAT, "schema_version": storage.schema_version()}
+        zf.writestr(_entry(MANIFEST), json.dumps(manifest))
+        with io.TextIOWrapper(zf.open(_entry(RECORDS), "w"), encoding="utf-8") as out:
+            for name, record in storage.iter_records():
+                line = {"name": name, **{field: value for field, value in record.items() if field != "version"}}
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                for field in IMAGE_FIELDS:
+                    if is_image_ref(record.get(field)):
+                        images[record[field]] = None
+                count += 1
+        for ref in images:
+            if image_store.exists(ref):
+                # Картинки уже сжаты, повторно их не пережимаем
+                zf.write(image_store.path(ref), IMAGES_DIR + ref, compress_type=zipfile.ZIP_STORED)
+            else:
+                logger.warning(f"Картинка {ref} не найдена и не попадет в архив")
+    logger.info(f"Выгружено достижений: {count}, картинок: {len(images)}")
+    return count
+
+
+def _entry(name):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def import_archive(source, storage, image_store, batch_size=IMPORT_BATCH_SIZE):
+    """Импортирует достижения из ZIP-архива source (путь или файловый объект).
+
+    Достижения с совпадающим названием заменяются, а достижение с совпадающим id
+    переносится под название из архива. Возвращает число импортированных записей.
+    Бросает ArchiveError, если архив или одна из записей некорректны.
+    """
+    try:
+        with zipfile.ZipFile(source) as zf:
+            schema_version = _read_manifest(zf)
+            records = _read_records(zf, schema_version, image_store, batch_size)
+            return storage.import_records(records, schema_version=SCHEMA_VERSION, batch_size=batch_size)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Файл не является ZIP-архивом: {e}") from e
+
+
+def _read_manifest(zf):
+    try:
+        manifest = json.loads(zf.read(MANIFEST))
+    except KeyError:
+        raise ArchiveError(f"В архиве нет {MANIFEST}") from None
+    except json.JSONDecodeError as e:
+        raise ArchiveError(f"{MANIFEST} поврежден: {e}") from e
+    if manifest.get("format") != ARCHIVE_FORMAT:
+        raise ArchiveError(f"Неподдерживаемый формат архива: {manifest.get('format')!r}")
+    schema_version = manifest.get("schema_version")
+    if not isinstance(schema_version, int) or not 0 <= schema_version <= SCHEMA_VERSION:
+        raise ArchiveError(f"Неподдерживаемая версия схемы: {schema_version!r}")
+    return schema_version
+
+
+def _read_records(zf, schema_version, image_store, batch_size):
+    """Отдает проверенные пары (название, запись), читая архив построчно"""
+    try:
+        lines = io.TextIOWrapper(zf.open(RECORDS), encoding="utf-8")
+    except KeyError:
+        raise ArchiveError(f"В архиве нет {RECORDS}") from None
+    with lines:
+        batch = {}
+        # id уже принятых записей: два достижения с одним id дали бы карточки с одинаковыми ключами
+        seen_ids = set()
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            name, record = _parse_line(line, line_number)
+            batch[name] = record
+            if len(batch) >= batch_size:
+                yield from _prepare_batch(zf, batch, schema_version, image_store, seen_ids)
+                batch = {}
+        yield from _prepare_batch(zf, batch, schema_version, image_store, seen_ids)
+
+
+def _parse_line(line, line_number):
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ArchiveError(f"Строка {line_number}: некорректный JSON ({e})") from e
+    if not isinstance(item, dict):
+        raise ArchiveError(f"Строка {line_number}: ожидался объект")
+    name = item.pop("name", None)
+    if not isinstance(name, str) or not name.strip():
+        raise ArchiveError(f"Строка {line_number}: нет названия достижения")
+    # Лишние поля отбрасываем, версию назначает хранилище
+    return name, {field: value for field, value in item.items() if field in FIELDS and field != "version"}
+
+
+def _prepare_batch(zf, batch, schema_version, image_store, seen_ids):
+    # Записи из архива старой схемы доводятся до текущей теми же миграциями, что и при загрузке
+    migrate(batch, schema_version, image_store)
+    for name, record in batch.items():
+        _validate(name, record)
+        if record["id"] in seen_ids:
+            raise ArchiveError(f"Достижение '{name}': id {record['id']} уже встречался в архиве")
+        seen_ids.add(record["id"])
+        for field in IMAGE_FIELDS:
+            record[field] = _import_image(zf, record[field], image_store)
+        yield name, record
+
+
+def _validate(name, record):
+    checks = (
+        ("id", isinstance(record.get("id"), str) and record.get("id")),
+        ("done", isinstance(record.get("done"), bool)),
+        ("description", isinstance(record.get("description"), str)),
+        ("category", isinstance(record.get("category"), str) and record.get("category").strip()),
+        ("date_received", record.get("date_received") is None
+            or isinstance(record.get("date_received"), str) and DATE_RE.match(record["date_received"])),
+    )
+    for field, valid in checks:
+        if not valid:
+            raise ArchiveError(f"Достижение '{name}': некорректное поле {field}")
+    for field in IMAGE_FIELDS:
+        value = record.setdefault(field, None)
+        if value is not None and not is_image_ref(value):
+            raise ArchiveError(f"Достижение '{name}': некорректная ссылка на картинку в {field}")
+
+
+def _import_image(zf, ref, image_store):
+    """Копирует картинку из архива в хранилище; без файла ссылка сбрасывается"""
+    if ref is None or image_store.exists(ref):
+        return ref
+    try:
+        info = zf.getinfo(IMAGES_DIR + ref)
+    except KeyError:
+        logger.warning(f"Картинки {ref} нет в архиве, будет показана стандартная")
+        return None
+    if info.file_size > MAX_IMAGE_BYTES:
+        raise ArchiveError(f"Картинка {ref} слишком большая: {info.file_size} байт")
+    try:
+        # Те же проверки формата и размеров в пикселях, что и у загрузок: маленький файл
+        # может развернуться в гигабайты при первом декодировании
+        with zf.open(info) as source:
+            open_checked(source, max_bytes=MAX_IMAGE_BYTES)
+        with zf.open(info) as source:
+            return image_store.put_file(ref, source, max_bytes=MAX_IMAGE_BYTES)
+    except InvalidImageError as e:
+        raise ArchiveError(f"Картинка {ref} отклонена: {e}") from e
+
+
+def main(argv=None):
+    base_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Импорт и экспорт достижений в ZIP-архив")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("archive", type=Path, help="путь к ZIP-архиву")
+    parser.add_argument("--storage", default=os.environ.get("ACHIEVEMENTS_STORAGE", "sqlite"),
+                        choices=("sqlite", "json"), help="бэкенд хранения (как ACHIEVEMENTS_STORAGE)")
+    parser.add_argument("--data-dir", type=Path, default=base_dir,
+                        help="каталог с data.json/data.db и static/images")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    image_store = ImageStore(args.data_dir / "static" / "images")
+    storage = open_storage(args.storage, args.data_dir / "data.json", args.data_dir / "data.db",
+                           migrate=import_migration(image_store))
+    if args.command == "export":
+        count = export_archive(storage, image_store, args.archive)
+        print(f"Exported {count} achievements to {args.archive}")
+    else:
+        try:
+            count = import_archive(args.archive, storage, image_store, batch_size=args.batch_size)
+        except ArchiveError as e:
+            parser.exit(1, f"Import failed: {e}\n")
+        print(f"Imported {count} achievements from {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Бенчмарк путей загрузки, сохранения и отрисовки доски.
+
+Для каждого размера доски генерируется синтетическая доска (см. generate.py),
+приложение копируется рядом с ней во временный каталог, и замеряются:
+
+* ``load_data``  — чтение всех записей из хранилища и сборка модели с индексом;
+* ``save_data``  — сохранение одного переключенного достижения (обычный клик);
+* ``save_full``  — полная перезапись доски (миграция, первое сохранение);
+* ``grouping``   — группировка по категориям и поиск по индексу;
+* ``app_cold``   — первый headless-запуск app.py через AppTest (с загрузкой доски);
+* ``app_rerun``  — повторный запуск скрипта на уже загруженной доске.
+
+Для каждой операции выводятся медиана и минимум времени, записанные байты
+(по /proc/self/io, только Linux) и пиковая память Python-аллокаций (tracemalloc).
+Каждый размер замеряется в отдельном процессе, чтобы кеши Streamlit и память
+одного прогона не влияли на другой.
+
+    python benchmarks/bench.py --sizes 100 1000 10000 --categories 20 --image-size 256
+    python benchmarks/bench.py --sizes 5000 --json results.json
+"""
+from pathlib import Path
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from generate import generate_board
+from model import Achievements
+
+# Что нужно приложению рядом с доской
+APP_FILES = ("*.py", "images", ".streamlit")
+
+OPERATIONS = ("load_data", "save_data", "save_full", "grouping", "app_cold", "app_rerun")
+
+
+def bytes_written():
+    """Сколько байт процесс записал с начала работы (None, если счетчик недоступен)"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(operation, repeat):
+    """Выполняет operation() repeat раз и возвращает метрики.
+
+    Время меряется без tracemalloc (он заметно замедляет код), пиковая память
+    и записанные байты — отдельным прогоном.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    written_before = bytes_written()
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    written_after = bytes_written()
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "bytes_written": written_after - written_before if written_before is not None else None,
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def stage_app(directory):
+    """Копирует приложение в каталог с доской: BASE_DIR приложения — каталог app.py"""
+    for pattern in APP_FILES:
+        for path in ROOT.glob(pattern):
+            target = directory / path.name
+            if path.is_dir():
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            else:
+                shutil.copy2(path, target)
+
+
+def run_case(achievements, categories, image_size, backend, repeat):
+    """Замеряет все операции на одной доске; выполняется в отдельном процессе"""
+    from streamlit.testing.v1 import AppTest
+
+    directory = Path(tempfile.mkdtemp(prefix="achievements-bench-"))
+    try:
+        storage, image_store, board = generate_board(directory, achievements, categories, image_size, backend=backend)
+        names = list(board)
+        results = {}
+
+        def load():
+            _, data = storage.load_with_version()
+            return Achievements(data)
+
+        results["load_data"] = measure(load, repeat)
+
+        board = load()
+        board.revision = storage.revision()
+        toggled = iter(range(10 ** 9))
+
+        def save_one():
+            name = names[next(toggled) % len(names)]
+            board[name]["done"] = not board[name]["done"]
+            board.mark_changed(name)
+            board.flush(storage)
+
+        results["save_data"] = measure(save_one, repeat)
+        results["save_full"] = measure(lambda: storage.save(board), max(1, repeat // 3))
+
+        def grouping():
+            board.index.query()
+            board.index.query(text="lorem 12")
+
+        results["grouping"] = measure(grouping, repeat)
+
+        stage_app(directory)
+        os.environ["ACHIEVEMENTS_STORAGE"] = backend
+
+        def app_run(app_test):
+            app_test.run()
+            if app_test.exception:
+                raise RuntimeError(app_test.exception)
+
+        # Холодный запуск бывает один раз на процесс: дальше доска и картинки уже в кеше Streamlit
+        start = time.perf_counter()
+        app_test = AppTest.from_file(str(directory / "app.py"), default_timeout=600)
+        app_run(app_test)
+        cold_ms = (time.perf_counter() - start) * 1000
+        results["app_cold"] = {"median_ms": cold_ms, "min_ms": cold_ms, "bytes_written": None, "peak_mb": None}
+        results["app_rerun"] = measure(lambda: app_run(app_test), repeat)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def format_table(rows):
+    header = f"{'board':>22} {'operation':>10} {'median ms':>10} {'min ms':>9} {'written KB':>11} {'peak MB':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        for operation in OPERATIONS:
+            metrics = row["results"][operation]
+            written = metrics["bytes_written"]
+            peak = metrics["peak_mb"]
+            lines.append(
+                f"{row['label']:>22} {operation:>10} {metrics['median_ms']:>10.1f} {metrics['min_ms']:>9.1f} "
+                f"{written / 1024 if written is not None else float('nan'):>11.1f} "
+                f"{peak if peak is not None else float('nan'):>8.1f}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк доски достижений")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="число достижений")
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--image-size", type=int, default=0, help="сторона картинок в пикселях, 0 — без картинок")
+    parser.add_argument("--storage", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="сохранить результаты в JSON")
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        # Дочерний процесс: один размер доски, результат — JSON в stdout
+        logging.disable(logging.WARNING)
+        results = run_case(args.sizes[0], args.categories, args.image_size, args.storage, args.repeat)
+        print(json.dumps(results))
+        return
+
+    rows = []
+    for size in args.sizes:
+        command = [
+            sys.executable, __file__, "--case",
+            "--sizes", str(size),
+            "--categories", str(args.categories),
+            "--image-size", str(args.image_size),
+            "--storage", args.storage,
+            "--repeat", str(args.repeat),
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        label = f"{size}x{args.categories}c/{args.image_size}px/{args.storage}"
+        rows.append({"label": label, "achievements": size, "categories": args.categories,
+                     "image_size": args.image_size, "storage": args.storage,
+                     "results": json.loads(output.strip().splitlines()[-1])})
+        print(f"done: {label}", file=sys.stderr)
+
+    print(format_table(rows))
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Генератор синтетических досок для бенчмарков.
+
+Создает в каталоге доску из N достижений в C категориях и (по желанию) набор
+картинок заданного размера — ровно в том виде, в каком ее хранит приложение:
+записи текущей схемы в выбранном хранилище и картинки в static/images.
+
+    python benchmarks/generate.py /tmp/board --achievements 5000 --categories 20 --image-size 512
+"""
+from io import BytesIO
+from pathlib import Path
+import argparse
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from image_store import ImageStore
+from migrations import SCHEMA_VERSION
+from model import Achievements, new_achievement_id
+from storage import open_storage
+
+
+def generate_images(image_store, count, size, seed=0):
+    """Кладет в хранилище count разных картинок size x size и возвращает ссылки на них"""
+    rng = random.Random(seed)
+    refs = []
+    for _ in range(count):
+        # Шум плохо сжимается — размер файлов близок к худшему случаю для своего разрешения
+        image = Image.effect_noise((size, size), rng.randint(20, 80)).convert("RGB")
+        tint = Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3)))
+        refs.append(image_store.ingest(_png_bytes(Image.blend(image, tint, 0.5))))
+    return refs
+
+
+def _png_bytes(image):
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def generate_records(count, categories, image_refs=(), done_ratio=0.3, seed=0):
+    """Возвращает {название: запись} текущей схемы"""
+    rng = random.Random(seed)
+    records = {}
+    for i in range(count):
+        done = rng.random() < done_ratio
+        gray = image_refs[(2 * i) % len(image_refs)] if image_refs else None
+        gold = image_refs[(2 * i + 1) % len(image_refs)] if image_refs else None
+        records[f"Achievement {i:06d}"] = {
+            "id": new_achievement_id(),
+            "done": done,
+            "description": f"Synthetic achievement #{i} " + "lorem ipsum " * rng.randint(1, 8),
+            "img_gray": gray,
+            "img_gold": gold,
+            "category": f"Category {i % categories:03d}",
+            "date_received": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if done else None,
+        }
+    return records
+
+
+def generate_board(directory, achievements, categories, image_size=0, images=8, backend="sqlite", seed=0):
+    """Создает доску в каталоге directory (data.json/data.db и static/images).
+
+    image_size=0 — без картинок (карточки покажут стандартные).
+    Возвращает хранилище, хранилище картинок и записанную доску.
+    """
+    directory = Path(directory)
+    image_store = ImageStore(directory / "static" / "images")
+    refs = generate_images(image_store, images, image_size, seed) if image_size else []
+    storage = open_storage(backend, directory / "data.json", directory / "data.db")
+    board = Achievements(generate_records(achievements, categories, refs, seed=seed))
+    board.revision = storage.save(board, schema_version=SCHEMA_VERSION)
+    return storage, image_store, board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерирует синтетическую доску достижений")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--achievements", "-n", type=int, default=1000)
+    parser.add_argument("--categories", "-c", type=int, default=10)
+    parser.add_argument("--image-size", type=int, default=0, help="сторона картинок в пикселях, 0 — без картинок")
+    parser.add_argument("--images", type=int, default=8, help="сколько разных картинок сгенерировать")
+    parser.add_argument("--storage", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    args.directory.mkdir(parents=True, exist_ok=True)
+    generate_board(args.directory, args.achievements, args.categories, args.image_size,
+                   args.images, args.storage, args.seed)
+    print(f"Generated {args.achievements} achievements in {args.categories} categories in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Журнал событий доски: получение достижений и правки.
+
+Журнал — файл NDJSON, в который события только дописываются (под межпроцессной
+блокировкой). Рядом с журналом в памяти ведутся агрегаты (``EventStats``):
+получения по дням, серии дней подряд и лента последних событий. Каждое событие
+обновляет их за O(1), поэтому чтение статистики не проходит ни по журналу,
+ни по доске.
+
+Чтобы журнал не рос бесконечно, он периодически сжимается: агрегаты и последние
+события записываются одной строкой-снимком ``{"type": "snapshot", ...}``,
+которая заменяет весь файл. При чтении снимок восстанавливает агрегаты,
+а события после него применяются как обычно.
+
+Журналом могут пользоваться несколько процессов: ``refresh()`` дочитывает
+только новые строки, а после сжатия другим процессом перечитывает файл заново.
+"""
+from collections import deque
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import json
+import logging
+import threading
+
+from fileio import file_lock, write_atomic
+
+logger = logging.getLogger(__name__)
+
+UNLOCK = "unlock"
+LOCK = "lock"
+CREATE = "create"
+EDIT = "edit"
+DELETE = "delete"
+SNAPSHOT = "snapshot"
+
+# Сколько последних событий хранится для ленты
+RECENT_EVENTS = 200
+# После скольких событий со времени последнего снимка журнал сжимается
+COMPACT_AFTER = 1000
+
+
+class EventStats:
+    """Агрегаты журнала, обновляемые по одному событию"""
+
+    def __init__(self, recent_events=RECENT_EVENTS):
+        self.counts = {}            # {тип события: сколько раз}
+        self.unlocks_per_day = {}   # {YYYY-MM-DD: получено достижений}
+        # Серии дней с получениями — отрезки [начало, конец] в порядковых номерах дней:
+        # {начало: конец} и {конец: начало}; добавление дня склеивает соседние отрезки за O(1)
+        self.streak_starts = {}
+        self.streak_ends = {}
+        self.longest_streak = 0
+        self.recent = deque(maxlen=recent_events)
+
+    def apply(self, event):
+        kind = event["type"]
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        if kind == UNLOCK:
+            day = event["ts"][:10]
+            self.unlocks_per_day[day] = self.unlocks_per_day.get(day, 0) + 1
+            if self.unlocks_per_day[day] == 1:
+                self._add_streak_day(date.fromisoformat(day).toordinal())
+        self.recent.append(event)
+
+    def _add_streak_day(self, day):
+        start = self.streak_ends.pop(day - 1, day)
+        end = self.streak_starts.pop(day + 1, day)
+        self.streak_starts.pop(start, None)
+        self.streak_ends.pop(end, None)
+        self.streak_starts[start] = end
+        self.streak_ends[end] = start
+        self.longest_streak = max(self.longest_streak, end - start + 1)
+
+    def current_streak(self, today=None):
+        """Дней подряд с получениями, заканчивая сегодня или вчера (серия еще не прервана)"""
+        today = (today or date.today()).toordinal()
+        for end in (today, today - 1):
+            start = self.streak_ends.get(end)
+            if start is not None:
+                return end - start + 1
+        return 0
+
+    def unlocks_last_days(self, days, today=None):
+        """{YYYY-MM-DD: получено} за последние days дней, включая дни без получений"""
+        today = today or date.today()
+        result = {}
+        for offset in range(days - 1, -1, -1):
+            day = (today - timedelta(days=offset)).isoformat()
+            result[day] = self.unlocks_per_day.get(day, 0)
+        return result
+
+    def to_snapshot(self):
+        return {
+            "counts": self.counts,
+            "unlocks_per_day": self.unlocks_per_day,
+            "streaks": [[start, end] for start, end in self.streak_starts.items()],
+            "longest_streak": self.longest_streak,
+            "recent": list(self.recent),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, recent_events=RECENT_EVENTS):
+        stats = cls(recent_events)
+        stats.counts = dict(snapshot.get("counts", {}))
+        stats.unlocks_per_day = dict(snapshot.get("unlocks_per_day", {}))
+        for start, end in snapshot.get("streaks", []):
+            stats.streak_starts[start] = end
+            stats.streak_ends[end] = start
+        stats.longest_streak = snapshot.get("longest_streak", 0)
+        stats.recent.extend(snapshot.get("recent", []))
+        return stats
+
+
+class EventLog:
+    """Журнал событий в файле NDJSON с агрегатами в памяти"""
+
+    def __init__(self, path: Path, recent_events=RECENT_EVENTS, compact_after=COMPACT_AFTER):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.recent_events = recent_events
+        self.compact_after = compact_after
+        self.lock = threading.RLock()
+        self.stats = EventStats(recent_events)
+        # Докуда файл уже прочитан и какой это файл (после сжатия inode меняется)
+        self._offset = 0
+        self._inode = None
+        self._since_snapshot = 0
+
+    def append(self, kind, achievement_id, name, **fields):
+        """Дописывает событие в журнал и учитывает его в агрегатах"""
+        event = {
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "type": kind,
+            "id": achievement_id,
+            "name": name,
+            **fields,
+        }
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock, file_lock(self.lock_path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            # Заодно подхватываем события, которые дописали другие процессы
+            self._refresh()
+            if self._since_snapshot >= self.compact_after:
+                self._compact()
+        return event
+
+    def refresh(self):
+        """Дочитывает новые события из файла; возвращает агрегаты"""
+        with self.lock:
+            self._refresh()
+            return self.stats
+
+    def _refresh(self):
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Файл сжали в другом процессе — читаем заново со снимка
+            self.stats = EventStats(self.recent_events)
+            self._offset = 0
+            self._inode = stat.st_ino
+            self._since_snapshot = 0
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Строку еще дописывают — дочитаем ее в следующий раз
+                    break
+                self._offset += len(raw)
+                self._apply_line(raw)
+
+    def _apply_line(self, raw):
+        try:
+            event = json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Пропущена поврежденная строка журнала событий: {e}")
+            return
+        if event.get("type") == SNAPSHOT:
+            self.stats = EventStats.from_snapshot(event["stats"], self.recent_events)
+            self._since_snapshot = 0
+            return
+        self.stats.apply(event)
+        self._since_snapshot += 1
+
+    def compact(self):
+        """Заменяет журнал одной строкой-снимком агрегатов"""
+        with self.lock, file_lock(self.lock_path):
+            self._refresh()
+            self._compact()
+
+    def _compact(self):
+        line = json.dumps({"type": SNAPSHOT, "stats": self.stats.to_snapshot()}, ensure_ascii=False) + "\n"
+        write_atomic(self.path, [line.encode("utf-8")])
+        stat = self.path.stat()
+        self._offset = stat.st_size
+        self._inode = stat.st_ino
+        logger.info(f"Журнал событий сжат: {self._since_snapshot} событий свернуто в снимок")
+        self._since_snapshot = 0
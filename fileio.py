@@ -0,0 +1,58 @@
+"""Общие приемы работы с файлами данных.
+
+* ``file_lock(path)`` — эксклюзивная межпроцессная блокировка на время
+  чтения-изменения-записи (на Windows блокировка недоступна и пропускается);
+* ``write_atomic(target, chunks)`` — запись через временный файл и rename:
+  читатели видят либо старый файл, либо новый целиком, но никогда не обрезанный.
+
+Ими пользуются data.json (storage), журнал событий (events) и хранилище картинок.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """Держит эксклюзивную блокировку на файле lock_path, пока выполняется блок"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_atomic(target: Path, chunks, verify=None):
+    """Записывает куски байт во временный файл рядом с target и переименовывает его в target.
+
+    verify() вызывается перед переименованием и может отменить запись исключением.
+    Возвращает число записанных байт.
+    """
+    target = Path(target)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}-")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if verify is not None:
+            verify()
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return size
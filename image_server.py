@@ -0,0 +1,73 @@
+"""Небольшой HTTP сервер для раздачи картинок из хранилища.
+
+Имена файлов в хранилище — хеш содержимого, поэтому картинку по одному и тому же
+URL можно кешировать навсегда: отдаём ETag по хешу и ``Cache-Control: immutable``.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+
+from image_store import MIME_TYPES
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def make_handler(store):
+    """Создает обработчик запросов для указанного хранилища"""
+
+    class ImageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def _serve(self, send_body):
+            ref = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+            # exists() пропускает только корректные ссылки, поэтому произвольные пути не отдаются
+            if not store.exists(ref):
+                self.send_error(404, "Image not found")
+                return
+
+            etag = f'"{ref.split(".", 1)[0]}"'
+            if etag in self.headers.get("If-None-Match", ""):
+                # Браузер уже знает эту картинку — тело не отправляем
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            path = store.path(ref)
+            size = path.stat().st_size
+            self.send_response(200)
+            self.send_header("Content-Type", MIME_TYPES[ref.rsplit(".", 1)[1]])
+            self.send_header("Content-Length", str(size))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            if send_body:
+                with open(path, "rb") as f:
+                    while chunk := f.read(64 * 1024):
+                        self.wfile.write(chunk)
+
+        def log_message(self, format, *args):
+            logger.debug("image_server: " + format, *args)
+
+    return ImageHandler
+
+
+def start_image_server(store, host="127.0.0.1", port=8502):
+    """Запускает сервер картинок в фоновом потоке и возвращает его.
+
+    По умолчанию сервер слушает только localhost: картинки по адресу
+    http://localhost:<port>/ видны лишь браузеру на той же машине.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    thread = threading.Thread(target=server.serve_forever, name="image-server", daemon=True)
+    thread.start()
+    logger.info(f"Сервер картинок запущен на {host}:{port}")
+    return server
@@ -0,0 +1,292 @@
+"""Хранилище картинок достижений, адресуемое по содержимому.
+
+Каждый файл сохраняется под именем ``<sha256>.<ext>``, поэтому одинаковые
+загрузки автоматически дедуплицируются, а в data.json хранится только ссылка.
+Рядом с оригиналом лежат уменьшенные копии ``<sha256>_<variant>.webp``
+для карточки и pop-up.
+"""
+from io import BytesIO
+from pathlib import Path
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from fileio import write_atomic
+import perf
+
+logger = logging.getLogger(__name__)
+
+# Ссылка на картинку: sha256 содержимого (+ имя уменьшенной копии) + расширение
+REF_RE = re.compile(r"^[0-9a-f]{64}(_(card|popup))?\.(png|jpg|gif|webp)$")
+
+# Размеры уменьшенных копий: карточка 90x90 и pop-up 200x200, с запасом x2 для HiDPI экранов
+VARIANT_SIZES = {
+    "card": 180,
+    "popup": 400,
+}
+WEBP_QUALITY = 85
+
+# Размер куска при потоковой записи файлов
+CHUNK_SIZE = 64 * 1024
+
+# Ограничения загрузок. Формат и размеры берутся из заголовка файла,
+# поэтому слишком большие и подозрительные картинки отсекаются до декодирования пикселей
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+MAX_DIMENSION = 8192
+MAX_PIXELS = 24_000_000
+ALLOWED_FORMATS = {"PNG", "JPEG", "GIF", "WEBP"}
+# Оригинал нужен только как источник уменьшенных копий, больше этого размера его не храним
+MAX_STORED_SIZE = 2048
+# Картинки, попавшие в хранилище не через загрузку (старый data.json, архив), могут быть больше
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Сколько загрузок декодируется одновременно: память на декодирование не растет с числом пользователей
+MAX_CONCURRENT_DECODES = 2
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+
+def is_image_ref(value):
+    """Проверяет, является ли значение ссылкой на картинку в хранилище"""
+    return isinstance(value, str) and REF_RE.match(value) is not None
+
+
+class InvalidImageError(ValueError):
+    """Загруженный файл не удалось разобрать как картинку"""
+
+
+class ImageTooLargeError(InvalidImageError):
+    """Файл или картинка превышают допустимые размеры"""
+
+
+def variant_ref(ref, variant):
+    """Возвращает ссылку на уменьшенную копию картинки"""
+    return f"{ref.split('.', 1)[0]}_{variant}.webp"
+
+
+def encode_webp(image: Image.Image, max_size=None):
+    """Кодирует картинку в WebP без метаданных, при необходимости уменьшая ее"""
+    image = image.copy()
+    if max_size:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    buffer = BytesIO()
+    # exif/icc не передаем — в файл попадают только пиксели
+    image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def decode_checked(image: Image.Image, max_size):
+    """Декодирует проверенную open_checked картинку, уменьшая ее до max_size.
+
+    Приводит картинку к RGB/RGBA с учетом EXIF-поворота.
+    """
+    try:
+        # JPEG декодируется сразу в уменьшенном масштабе, не разворачивая все пиксели
+        image.draft("RGB", (max_size, max_size))
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(str(e)) from e
+    image = _normalize(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image
+
+
+def open_checked(source, max_bytes=MAX_UPLOAD_BYTES):
+    """Открывает картинку из файлового объекта, читая только заголовок.
+
+    Проверяет размер файла, настоящий формат (по содержимому, а не по расширению)
+    и размеры в пикселях. Пиксели не декодируются. Бросает InvalidImageError
+    или ImageTooLargeError.
+    """
+    size = _stream_size(source)
+    if size == 0:
+        raise InvalidImageError("Пустой файл")
+    if size > max_bytes:
+        raise ImageTooLargeError(f"Размер файла {size} байт, допустимо не больше {max_bytes}")
+    try:
+        image = Image.open(source)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(str(e)) from e
+    if image.format not in ALLOWED_FORMATS:
+        raise InvalidImageError(f"Неподдерживаемый формат: {image.format}")
+    width, height = image.size
+    if width > MAX_DIMENSION or height > MAX_DIMENSION:
+        raise ImageTooLargeError(f"Картинка {width}x{height} больше допустимых {MAX_DIMENSION}x{MAX_DIMENSION}")
+    if width * height > MAX_PIXELS:
+        raise ImageTooLargeError(f"Картинка {width}x{height} содержит {width * height} пикселей, "
+                                 f"допустимо не больше {MAX_PIXELS}")
+    return image
+
+
+def _stream_size(source):
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    size = source.tell() - position
+    source.seek(position)
+    return size
+
+
+def _normalize(image):
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def detect_extension(data: bytes):
+    """Определяет расширение картинки по сигнатуре файла"""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    # Неизвестный формат храним как png — так же, как раньше отдавался base64
+    return "png"
+
+
+class ImageStore:
+    """Каталог с картинками, где имя файла — хеш его содержимого"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._decode_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DECODES)
+
+    def path(self, ref):
+        """Возвращает путь к файлу по ссылке"""
+        if not is_image_ref(ref):
+            raise ValueError(f"Некорректная ссылка на картинку: {ref!r}")
+        return self.root / ref
+
+    def exists(self, ref):
+        return is_image_ref(ref) and self.path(ref).exists()
+
+    def ingest(self, data: bytes):
+        """Как ingest_stream, но для байтов в памяти"""
+        return self.ingest_stream(BytesIO(data))
+
+    def ingest_stream(self, source, max_bytes=MAX_UPLOAD_BYTES):
+        """Проверяет загрузку по заголовку, сохраняет оригинал и уменьшенные копии в WebP.
+
+        source — файловый объект с произвольным доступом (например, UploadedFile Streamlit);
+        целиком в отдельную копию он не читается. Возвращает ссылку на оригинал.
+        Бросает InvalidImageError, если это не картинка, и ImageTooLargeError,
+        если файл или картинка слишком большие.
+        """
+        image = open_checked(source, max_bytes)
+        with self._decode_slots:
+            image = decode_checked(image, MAX_STORED_SIZE)
+            ref = self.put(encode_webp(image))
+            for variant, size in VARIANT_SIZES.items():
+                self._put_as(variant_ref(ref, variant), lambda: encode_webp(image, size))
+        return ref
+
+    def variant(self, ref, variant):
+        """Возвращает ссылку на уменьшенную копию, создавая ее при первом обращении.
+
+        Нужен для картинок, которые попали в хранилище не через загрузку: перенесенных
+        из старого data.json, стандартных и импортированных из архива. Они проверяются
+        так же, как загрузки (см. open_checked), и декодируются в общем лимите
+        одновременных декодирований. Если копию сделать не удалось или картинка
+        превышает ограничения, возвращает ссылку на оригинал.
+        """
+        target = variant_ref(ref, variant)
+        if self.path(target).exists():
+            return target
+        size = VARIANT_SIZES[variant]
+        try:
+            with open(self.path(ref), "rb") as f:
+                image = open_checked(f, MAX_SOURCE_BYTES)
+                with self._decode_slots:
+                    data = encode_webp(decode_checked(image, size))
+                perf.count("bytes_read", f.tell())
+        except (InvalidImageError, OSError) as e:
+            logger.warning(f"Не удалось сделать уменьшенную копию {ref}: {e}")
+            return ref
+        self._put_as(target, lambda: data)
+        return target
+
+    def put(self, data: bytes):
+        """Сохраняет байты картинки и возвращает ссылку на них"""
+        ref = f"{hashlib.sha256(data).hexdigest()}.{detect_extension(data)}"
+        self._put_as(ref, lambda: data)
+        return ref
+
+    def put_file(self, ref, source, max_bytes=None):
+        """Копирует готовую картинку (например, из архива) под известной ссылкой, читая ее по частям.
+
+        Содержимое сверяется с хешем в ссылке. Бросает InvalidImageError, если хеш
+        не совпал или файл оказался больше max_bytes.
+        """
+        target = self.path(ref)
+        if target.exists():
+            return ref
+        digest = hashlib.sha256()
+
+        def chunks():
+            size = 0
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise InvalidImageError(f"Картинка {ref} больше {max_bytes} байт")
+                digest.update(chunk)
+                yield chunk
+
+        def verify():
+            if digest.hexdigest() != ref.split(".", 1)[0]:
+                raise InvalidImageError(f"Содержимое картинки не совпадает со ссылкой {ref}")
+
+        self._write_atomic(target, chunks(), verify)
+        return ref
+
+    def _put_as(self, ref, produce):
+        """Атомарно записывает файл под ссылкой ref, если его еще нет"""
+        target = self.path(ref)
+        if target.exists():
+            # Такая картинка уже загружалась — повторно не пишем
+            return
+        self._write_atomic(target, [produce()])
+
+    def _write_atomic(self, target, chunks, verify=None):
+        """Атомарно записывает куски в target (см. fileio.write_atomic)"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        perf.count("bytes_written", write_atomic(target, chunks, verify))
+
+    def read(self, ref):
+        """Читает байты картинки по ссылке, None если файла нет"""
+        try:
+            with open(self.path(ref), "rb") as f:
+                data = f.read()
+            perf.count("bytes_read", len(data))
+            return data
+        except (OSError, ValueError) as e:
+            logger.warning(f"Картинка {ref} недоступна: {e}")
+            return None
+
+    def migrate_inline(self, value):
+        """Переносит base64 из старого формата data.json в хранилище.
+
+        Возвращает ссылку на картинку (или None, если значение не удалось разобрать).
+        Ссылки и None возвращаются без изменений.
+        """
+        if value is None or is_image_ref(value):
+            return value
+        try:
+            data = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError, TypeError) as e:
+            logger.warning(f"Не удалось декодировать встроенную картинку: {e}")
+            return None
+        if not data:
+            return None
+        return self.put(data)
@@ -0,0 +1,83 @@
+"""Миграции схемы данных доски.
+
+Версия схемы хранится вместе с данными (см. storage). При загрузке выполняются
+только миграции новее сохраненной версии, после чего данные сразу записываются
+с текущей ``SCHEMA_VERSION`` — при следующих загрузках записи читаются как есть,
+без поправок.
+
+Данные, сохраненные до появления версии схемы, считаются версией 0. Такие данные
+могли быть частично обновлены прежним кодом, поэтому каждая миграция пропускает
+записи, в которых нужное поле уже есть.
+"""
+from datetime import datetime
+import logging
+
+from model import new_achievement_id
+
+logger = logging.getLogger(__name__)
+
+
+def _add_category_and_date(data, image_store):
+    """Категория по умолчанию и дата получения для старых достижений"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    for achievement in data.values():
+        if "category" not in achievement:
+            achievement["category"] = "General"
+        if "date_received" not in achievement:
+            # Для выполненных достижений дата неизвестна — ставим дату миграции
+            achievement["date_received"] = today if achievement.get("done") else None
+
+
+def _move_inline_images(data, image_store):
+    """Переносит base64 из img_gray/img_gold в хранилище изображений"""
+    moved = 0
+    for achievement in data.values():
+        for field in ("img_gray", "img_gold"):
+            value = achievement.get(field)
+            ref = image_store.migrate_inline(value)
+            if ref != value:
+                achievement[field] = ref
+                moved += 1
+    if moved:
+        logger.info(f"Встроенные картинки перенесены в хранилище изображений: {moved}")
+
+
+def _add_ids(data, image_store):
+    """Неизменяемый id, к которому привязано состояние карточки в сессии"""
+    for achievement in data.values():
+        if not achievement.get("id"):
+            achievement["id"] = new_achievement_id()
+
+
+# Миграция с индексом i переводит данные из версии i в версию i + 1
+MIGRATIONS = (
+    _add_category_and_date,
+    _move_inline_images,
+    _add_ids,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(data, from_version, image_store):
+    """Применяет к данным (на месте) все миграции новее from_version.
+
+    Возвращает True, если данные изменились и их нужно сохранить с новой версией схемы.
+    """
+    if from_version > SCHEMA_VERSION:
+        raise ValueError(f"Данные сохранены более новой версией приложения (схема {from_version})")
+    for version in range(from_version, SCHEMA_VERSION):
+        logger.info(f"Миграция данных: схема {version} -> {version + 1}")
+        MIGRATIONS[version](data, image_store)
+    return from_version < SCHEMA_VERSION
+
+
+def import_migration(image_store):
+    """Миграция для импорта data.json в SQLite (см. storage.SqliteStorage).
+
+    Файл мигрируется до записи в базу, пока видно, каких полей в записях нет.
+    """
+    def migrate_document(data, from_version):
+        migrate(data, from_version, image_store)
+        return SCHEMA_VERSION
+    return migrate_document
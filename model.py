@@ -0,0 +1,232 @@
+"""Модель доски достижений с отслеживанием изменений.
+
+``Achievements`` — обычный словарь ``{название: запись}``, который запоминает,
+какие записи были добавлены, изменены или удалены с момента последнего сохранения.
+Добавление и удаление отслеживаются автоматически, изменение полей внутри
+записи нужно отметить через ``mark_changed``. Каждое изменение увеличивает
+``version`` записи; при сохранении хранилище сверяет, что запись не поменяли
+с тех пор, как мы ее прочитали (см. storage.ConflictError).
+
+``SharedAchievements`` держит одну загруженную копию доски на процесс:
+все сессии Streamlit работают с ней, а перечитывается она только тогда,
+когда ревизия в хранилище изменилась не нами. Доска, подставленная вместо
+данных, которые не удалось загрузить (ревизия ``LOAD_FAILED``), не кешируется:
+следующий запуск скрипта снова попробует прочитать хранилище.
+"""
+import logging
+import threading
+from typing import Optional, TypedDict
+import uuid
+
+from search_index import AchievementIndex
+from storage import ConflictError
+
+logger = logging.getLogger(__name__)
+
+# Счетчики сохранений за все время работы процесса (общие для всех сессий)
+_stats_lock = threading.Lock()
+save_stats = {
+    "writes": 0,           # сохранений, дошедших до хранилища
+    "records_written": 0,  # записанных (или удаленных) записей
+    "writes_avoided": 0,   # пропущенных сохранений: ничего не изменилось
+}
+
+
+# Ревизия доски, подставленной вместо данных, которые не удалось загрузить
+LOAD_FAILED = object()
+
+
+class BoardNotLoadedError(Exception):
+    """Доска подставлена вместо данных, которые не удалось загрузить, и не сохраняется"""
+
+
+def _count(key, value=1):
+    with _stats_lock:
+        save_stats[key] += value
+
+
+class Achievement(TypedDict):
+    """Запись достижения в том виде, в каком она лежит в хранилище (схема migrations.SCHEMA_VERSION)"""
+    id: str                       # неизменяемый идентификатор, не меняется при переименовании
+    done: bool
+    description: str
+    img_gray: Optional[str]       # ссылка в хранилище изображений (см. image_store)
+    img_gold: Optional[str]
+    category: str
+    date_received: Optional[str]  # YYYY-MM-DD
+    version: int                  # счетчик изменений для проверки конфликтов
+
+
+def new_achievement_id():
+    """Неизменяемый идентификатор достижения: не меняется при переименовании"""
+    return uuid.uuid4().hex
+
+
+class Achievements(dict[str, Achievement]):
+    """Словарь достижений с набором «грязных» записей"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {название: версия в хранилище до изменения}; словари сохраняют порядок добавления
+        self.changed = {}
+        self.deleted = {}
+        # Ревизия хранилища, которой соответствует содержимое словаря
+        self.revision = None
+        # Словарь общий для всех сессий, поэтому изменения и сохранение идут под блокировкой
+        self.lock = threading.RLock()
+        # Индекс для поиска и группировки по категориям; строится один раз при загрузке
+        self.index = AchievementIndex(self)
+
+    def _base_version(self, name):
+        """Версия записи в хранилище до первого несохраненного изменения (None — записи нет)"""
+        if name in self.changed:
+            return self.changed[name]
+        if name in self.deleted:
+            return self.deleted[name]
+        record = self.get(name)
+        return record.get("version", 0) if record is not None else None
+
+    def __setitem__(self, name, record):
+        with self.lock:
+            base = self._base_version(name)
+            previous = self.get(name)
+            record["version"] = previous.get("version", 0) if previous is not None else 0
+            super().__setitem__(name, record)
+            self.deleted.pop(name, None)
+            self.changed[name] = base
+            record["version"] += 1
+            self.index.update(name, record)
+
+    def __delitem__(self, name):
+        with self.lock:
+            base = self._base_version(name)
+            super().__delitem__(name)
+            self.index.remove(name)
+            self.changed.pop(name, None)
+            if base is not None:
+                # Удаляем только то, что уже есть в хранилище
+                self.deleted[name] = base
+
+    def rename(self, old_name, new_name):
+        """Переносит запись под новое название; id и содержимое записи не меняются.
+
+        Версия продолжается с прежней, а не начинается заново: иначе после
+        переименования туда и обратно запись вернулась бы к уже виденной версии,
+        и устаревшая форма прошла бы проверку конфликта.
+        """
+        with self.lock:
+            record = self[old_name]
+            version = record.get("version", 0)
+            del self[old_name]
+            self[new_name] = record
+            record["version"] = version + 1
+
+    def mark_changed(self, name):
+        """Отмечает запись как измененную и увеличивает ее версию"""
+        with self.lock:
+            self.changed[name] = self._base_version(name)
+            self[name]["version"] = self[name].get("version", 0) + 1
+            self.index.update(name, self[name])
+
+    def version(self, name):
+        """Текущая версия записи (None, если записи нет)"""
+        record = self.get(name)
+        return record.get("version", 0) if record is not None else None
+
+    def reload(self, storage):
+        """Заменяет содержимое доски данными из хранилища, отбрасывая несохраненные изменения.
+
+        Доска меняется на месте: сессии и их фрагменты держат ссылку именно на этот объект.
+        """
+        with self.lock:
+            # Ревизию читаем до загрузки: если запись случится во время чтения, доску перечитают еще раз
+            revision = storage.revision()
+            data = storage.load() or {}
+            # dict.clear/update не вызывают __setitem__: версии записей остаются как в хранилище
+            dict.clear(self)
+            dict.update(self, data)
+            self.changed.clear()
+            self.deleted.clear()
+            self.index = AchievementIndex(self)
+            self.revision = revision
+
+    @property
+    def is_dirty(self):
+        return bool(self.changed or self.deleted)
+
+    def flush(self, storage):
+        """Сохраняет в хранилище только изменившиеся записи.
+
+        Если изменений нет, хранилище не трогается. Возвращает True, если запись была.
+        При конфликте версий изменения отбрасываются, доска сразу перечитывается
+        из хранилища (см. reload) и ConflictError пробрасывается дальше.
+        Доска с ревизией LOAD_FAILED не сохраняется: изменения отбрасываются
+        с BoardNotLoadedError, чтобы стандартные достижения не затерли настоящие данные.
+        """
+        with self.lock:
+            if not self.is_dirty:
+                _count("writes_avoided")
+                return False
+            if self.revision is LOAD_FAILED:
+                self.changed.clear()
+                self.deleted.clear()
+                raise BoardNotLoadedError("Данные не загружены, сохранение отключено")
+            try:
+                self.revision = storage.save(
+                    self,
+                    changed=dict(self.changed),
+                    deleted=dict(self.deleted),
+                    base_revision=self.revision,
+                )
+            except ConflictError:
+                # Отвергнутые правки уже лежат в общей доске, и фрагменты всех сессий
+                # показывали бы их как сохраненные до полного перезапуска скрипта
+                try:
+                    self.reload(storage)
+                except Exception as e:
+                    logger.error(f"Не удалось перечитать доску после конфликта: {e}")
+                    self.changed.clear()
+                    self.deleted.clear()
+                    self.revision = None
+                raise
+            _count("writes")
+            _count("records_written", len(self.changed) + len(self.deleted))
+            logger.debug(f"Сохранено изменений: {len(self.changed)}, удалено: {len(self.deleted)}")
+            self.changed.clear()
+            self.deleted.clear()
+            return True
+
+
+class SharedAchievements:
+    """Общая для процесса копия доски с проверкой ревизии хранилища"""
+
+    def __init__(self, storage, loader):
+        self.storage = storage
+        self.loader = loader
+        self.achievements = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Возвращает общую доску, перечитывая ее, если хранилище изменилось извне"""
+        with self.lock:
+            try:
+                revision = self.storage.revision()
+            except Exception as e:
+                # Хранилище недоступно (поврежденный файл, блокировка дольше таймаута)
+                logger.error(f"Не удалось прочитать ревизию хранилища: {e}")
+                if self.achievements is not None and self.achievements.revision is not LOAD_FAILED:
+                    # Уже загруженная доска лучше стандартной: попробуем снова при следующем запуске
+                    return self.achievements
+                # loader сам покажет ошибку загрузки и вернет доску с ревизией LOAD_FAILED
+                revision = LOAD_FAILED
+            current = self.achievements
+            if (current is None or current.revision is LOAD_FAILED
+                    or (revision != current.revision and not current.is_dirty)):
+                if current is not None and current.revision is not LOAD_FAILED:
+                    logger.info("Данные изменились в хранилище, перечитываем доску")
+                # Ревизию читаем до загрузки: если запись случится во время чтения, перечитаем еще раз
+                loaded = self.loader()
+                if loaded.revision is None:
+                    loaded.revision = revision
+                self.achievements = loaded
+            return self.achievements
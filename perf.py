@@ -0,0 +1,136 @@
+"""Встроенные замеры производительности.
+
+Включаются переменной окружения ``ACHIEVEMENTS_PERF=1``. Выключенные таймеры
+ничего не делают, счетчики байт и запусков ведутся всегда — они дешевые.
+
+* ``timed(name)`` — таймер, работает как контекстный менеджер и как декоратор;
+  накапливает число вызовов, суммарное и максимальное время по процессу;
+* ``count(name, value)`` — счетчики процесса (байты прочитано/записано, запуски);
+* ``begin_run()``/``end_run()`` — границы одного запуска скрипта: по его окончании
+  в лог пишется строка ``perf {...}`` в JSON с разбивкой времени этого запуска;
+  ``begin_run(FRAGMENT)`` отмечает перезапуск одного фрагмента (``perf fragment {...}``);
+* ``prometheus_text()`` — все метрики в текстовом формате Prometheus.
+"""
+from contextlib import ContextDecorator
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("ACHIEVEMENTS_PERF", "").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+# {название таймера: [вызовов, суммарно секунд, максимум секунд]}
+timers = {}
+counters = {
+    "reruns": 0,          # запусков скрипта
+    "fragment_reruns": 0, # перезапусков одного фрагмента (st.fragment) без скрипта
+    "bytes_read": 0,      # прочитано из хранилища данных и картинок
+    "bytes_written": 0,   # записано в хранилище данных и картинок
+}
+
+# Виды запусков: весь скрипт или только один фрагмент
+SCRIPT = "script"
+FRAGMENT = "fragment"
+
+# Замеры текущего запуска; у каждой сессии Streamlit свой поток
+_run = threading.local()
+
+
+def count(name, value=1):
+    with _lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+class timed(ContextDecorator):
+    """Замеряет время блока кода или функции под именем name"""
+
+    def __init__(self, name):
+        self.name = name
+        self._starts = threading.local()
+
+    def __enter__(self):
+        if enabled:
+            self._starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            _record(self.name, time.perf_counter() - self._starts.stack.pop())
+        return False
+
+
+def _record(name, seconds):
+    with _lock:
+        stats = timers.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+    current = getattr(_run, "timers", None)
+    if current is not None:
+        calls, total = current.get(name, (0, 0.0))
+        current[name] = (calls + 1, total + seconds)
+
+
+def begin_run(kind=SCRIPT):
+    """Отмечает начало запуска скрипта или перезапуска фрагмента (kind=FRAGMENT)"""
+    count("fragment_reruns" if kind == FRAGMENT else "reruns")
+    if enabled:
+        _run.kind = kind
+        _run.started = time.perf_counter()
+        _run.timers = {}
+
+
+def end_run():
+    """Пишет в лог разбивку времени завершившегося запуска и возвращает ее (None без замеров)"""
+    if not enabled or getattr(_run, "timers", None) is None:
+        return None
+    entry = {
+        "total_ms": round((time.perf_counter() - _run.started) * 1000, 2),
+        "timers": {
+            name: {"calls": calls, "ms": round(total * 1000, 2)}
+            for name, (calls, total) in sorted(_run.timers.items(), key=lambda item: -item[1][1])
+        },
+    }
+    _run.timers = None
+    prefix = "perf fragment " if _run.kind == FRAGMENT else "perf "
+    logger.info(prefix + json.dumps(entry, ensure_ascii=False))
+    return entry
+
+
+def last_run_timers():
+    """Замеры текущего (еще не завершенного) запуска: {имя: (вызовов, секунд)}"""
+    return dict(getattr(_run, "timers", None) or {})
+
+
+def snapshot():
+    """Копия таймеров и счетчиков процесса"""
+    with _lock:
+        return {name: tuple(stats) for name, stats in timers.items()}, dict(counters)
+
+
+def prometheus_text(extra_counters=None):
+    """Метрики процесса в текстовом формате Prometheus.
+
+    extra_counters — дополнительные счетчики {имя: значение} (например, model.save_stats).
+    """
+    timer_stats, counter_values = snapshot()
+    counter_values.update(extra_counters or {})
+    lines = [
+        "# HELP achievements_timer_seconds Time spent in instrumented code paths.",
+        "# TYPE achievements_timer_seconds summary",
+    ]
+    for name, (calls, total, _) in sorted(timer_stats.items()):
+        lines.append(f'achievements_timer_seconds_count{{name="{name}"}} {calls}')
+        lines.append(f'achievements_timer_seconds_sum{{name="{name}"}} {total:.6f}')
+    lines.append("# HELP achievements_timer_max_seconds Slowest single call of an instrumented code path.")
+    lines.append("# TYPE achievements_timer_max_seconds gauge")
+    for name, (_, _, slowest) in sorted(timer_stats.items()):
+        lines.append(f'achievements_timer_max_seconds{{name="{name}"}} {slowest:.6f}')
+    for name, value in sorted(counter_values.items()):
+        lines.append(f"# TYPE achievements_{name}_total counter")
+        lines.append(f"achievements_{name}_total {value}")
+    return "\n".join(lines) + "\n"
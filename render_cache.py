@@ -0,0 +1,58 @@
+"""Кеш готовой HTML-разметки карточек.
+
+Разметка карточки и ее pop-up зависит только от содержимого записи, поэтому
+ее можно один раз собрать и дальше отдавать по ключу из этого содержимого
+(см. ``markup_key``): неизменившаяся карточка стоит одного поиска в словаре
+вместо проверки файлов картинок и форматирования строк. Версия записи в ключ
+не входит: после перечитывания доски или импорта архива одна и та же версия
+может означать разное содержимое.
+
+Кеш общий для всех сессий процесса и ограничен по размеру: при переполнении
+вытесняются давно не использованные записи.
+"""
+from collections import OrderedDict
+import threading
+
+DEFAULT_MAX_ENTRIES = 4096
+
+# Поля записи, из которых собирается разметка карточки и pop-up
+MARKUP_FIELDS = ("id", "done", "description", "category", "date_received", "img_gray", "img_gold")
+
+
+def markup_key(name, record):
+    """Ключ кеша разметки: название и все поля записи, которые попадают в разметку"""
+    return (name, *(record.get(field) for field in MARKUP_FIELDS))
+
+
+class RenderCache:
+    """Ограниченный LRU-кеш {ключ: разметка}"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Возвращает разметку по ключу, собирая ее через build() при промахе"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        # Сборка идет без блокировки: две сессии могут собрать одну карточку одновременно,
+        # результат у них одинаковый
+        value = build()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,141 @@
+"""Индекс достижений для поиска, фильтрации и сортировки.
+
+Индекс живет вместе с общей доской (model.Achievements) и обновляется точечно
+при добавлении, изменении и удалении записи, а не перестраивается на каждом
+запуске скрипта. Для каждой записи заранее посчитаны нормализованная категория
+и текст для поиска, поэтому запрос — это проход по готовым строкам без
+повторной нормализации. Там же ведутся счетчики выполненных достижений по
+категориям, так что статистика читается без прохода по доске.
+"""
+import threading
+
+DEFAULT_CATEGORY = "General"
+
+SORT_DEFAULT = "default"
+SORT_NEWEST = "newest"
+SORT_OLDEST = "oldest"
+
+
+def normalize_category(category):
+    """Категория без пробелов по краям; пустая или некорректная превращается в General"""
+    if not isinstance(category, str):
+        return DEFAULT_CATEGORY
+    return category.strip() or DEFAULT_CATEGORY
+
+
+class IndexEntry:
+    __slots__ = ("category", "text", "done", "date")
+
+    def __init__(self, name, record):
+        self.category = normalize_category(record.get("category"))
+        self.text = f"{name}\n{record.get('description') or ''}".casefold()
+        self.done = bool(record.get("done"))
+        self.date = record.get("date_received")
+
+
+class AchievementIndex:
+    """Категории и поисковые данные по каждому достижению"""
+
+    def __init__(self, achievements=None):
+        self.entries = {}
+        # {категория: {название: None}} — упорядоченное множество названий в порядке доски
+        self.by_category = {}
+        # {категория: выполнено}; всего — len(by_category[категория])
+        self.done_by_category = {}
+        self.lock = threading.RLock()
+        for name, record in (achievements or {}).items():
+            self.update(name, record)
+
+    def update(self, name, record):
+        """Добавляет или обновляет запись в индексе"""
+        with self.lock:
+            entry = IndexEntry(name, record)
+            previous = self.entries.get(name)
+            if previous is not None:
+                self._count_done(previous, -1)
+                if previous.category != entry.category:
+                    self._discard(name, previous.category)
+            self.entries[name] = entry
+            self.by_category.setdefault(entry.category, {})[name] = None
+            self._count_done(entry, 1)
+
+    def remove(self, name):
+        """Убирает запись из индекса"""
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is not None:
+                self._count_done(entry, -1)
+                self._discard(name, entry.category)
+
+    def _count_done(self, entry, delta):
+        if entry.done:
+            self.done_by_category[entry.category] = self.done_by_category.get(entry.category, 0) + delta
+
+    def _discard(self, name, category):
+        names = self.by_category.get(category)
+        if names is None:
+            return
+        names.pop(name, None)
+        if not names:
+            del self.by_category[category]
+            self.done_by_category.pop(category, None)
+
+    def categories(self):
+        """Категории в алфавитном порядке без учета регистра"""
+        with self.lock:
+            return sorted(self.by_category, key=str.lower)
+
+    def completion(self):
+        """{категория: (выполнено, всего)} в алфавитном порядке категорий"""
+        with self.lock:
+            return {
+                category: (self.done_by_category.get(category, 0), len(self.by_category[category]))
+                for category in self.categories()
+            }
+
+    def query(self, text="", categories=None, done=None, date_from=None, date_to=None, sort=SORT_DEFAULT):
+        """Возвращает {категория: [названия]} для записей, подходящих под фильтры.
+
+        text — подстрока в названии или описании (без учета регистра);
+        categories — выбранные категории (пусто — все);
+        done — True/False для фильтра по статусу, None — без фильтра;
+        date_from/date_to — границы даты получения в формате YYYY-MM-DD (включительно);
+        sort — SORT_DEFAULT (порядок доски), SORT_NEWEST или SORT_OLDEST по дате получения.
+        """
+        needle = text.strip().casefold()
+        date_filter = date_from is not None or date_to is not None
+        result = {}
+        with self.lock:
+            for category in self.categories():
+                if categories and category not in categories:
+                    continue
+                names = []
+                for name in self.by_category[category]:
+                    entry = self.entries[name]
+                    if needle and needle not in entry.text:
+                        continue
+                    if done is not None and entry.done != done:
+                        continue
+                    if date_filter:
+                        if not entry.date:
+                            continue
+                        if date_from is not None and entry.date < date_from:
+                            continue
+                        if date_to is not None and entry.date > date_to:
+                            continue
+                    names.append(name)
+                if names:
+                    result[category] = names
+            # Сортировка читает записи индекса, поэтому тоже идет под блокировкой:
+            # другая сессия может удалить запись сразу после отбора
+            if sort != SORT_DEFAULT:
+                for category, names in result.items():
+                    result[category] = self._sorted_by_date(names, newest_first=sort == SORT_NEWEST)
+        return result
+
+    def _sorted_by_date(self, names, newest_first):
+        # Достижения без даты всегда в конце списка
+        dated = [name for name in names if self.entries[name].date]
+        undated = [name for name in names if not self.entries[name].date]
+        dated.sort(key=lambda name: self.entries[name].date, reverse=newest_first)
+        return dated + undated
@@ -0,0 +1,509 @@
+"""Слой хранения достижений.
+
+Все хранилища работают со словарем ``{название: запись}`` и умеют сохранять
+либо весь словарь, либо только изменившиеся записи:
+
+* ``JsonStorage`` — прежний формат data.json; файл переписывается атомарно
+  (временный файл + rename) под межпроцессной блокировкой;
+* ``SqliteStorage`` — SQLite в режиме WAL, пишется только изменившаяся строка.
+
+Вместе с данными хранится версия схемы (``schema_version()``, см. migrations):
+в SQLite — в таблице meta, в data.json — в обертке
+``{"schema_version": N, "max_version": M, "achievements": {...}}``. Файл без
+обертки — данные версии 0, сохраненные до появления схемы.
+
+``revision()`` дешево сообщает версию данных в хранилище: по ней общий для
+процесса кеш понимает, что данные поменялись снаружи и их нужно перечитать.
+
+У каждой записи есть счетчик ``version``. При частичном сохранении для каждой
+записи передается версия, от которой она была изменена; если в хранилище
+к этому моменту лежит другая версия, сохранение отменяется с ConflictError.
+Хранилище помнит наибольшую версию, которая в нем когда-либо была (``max_version``),
+включая версии удаленных записей: импорт продолжает счетчик с нее, поэтому
+восстановленное из архива достижение не получает уже использованную версию.
+"""
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+import json
+import logging
+import sqlite3
+import threading
+
+from fileio import file_lock, write_atomic
+import perf
+
+logger = logging.getLogger(__name__)
+
+# Поля записи достижения в том порядке, в котором они лежат в data.json
+FIELDS = ("id", "done", "description", "img_gray", "img_gold", "category", "date_received", "version")
+
+# Сколько записей массового импорта пишется одним executemany
+IMPORT_BATCH_SIZE = 500
+
+
+class ConflictError(Exception):
+    """Запись изменили или удалили в другой сессии после того, как мы ее прочитали"""
+
+    def __init__(self, name):
+        super().__init__(f"Достижение '{name}' было изменено в другой сессии")
+        self.name = name
+
+
+def read_json_document(path: Path):
+    """Читает data.json и возвращает (версия схемы, словарь достижений, наибольшая версия записи)"""
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+        perf.count("bytes_read", f.tell())
+    if isinstance(document.get("schema_version"), int):
+        achievements = document.get("achievements") or {}
+        return document["schema_version"], achievements, document.get("max_version") or 0
+    # Старый формат: словарь достижений на верхнем уровне
+    return 0, document, 0
+
+
+def check_versions(current_versions, changed, deleted):
+    """Сверяет ожидаемые версии записей с текущими (compare-and-swap).
+
+    current_versions — функция name -> версия в хранилище или None, если записи нет.
+    changed/deleted — {название: ожидаемая версия}; None означает «записи быть не должно».
+    """
+    for name, expected in {**changed, **deleted}.items():
+        if current_versions(name) != expected:
+            raise ConflictError(name)
+
+
+class JsonStorage:
+    """Хранение в одном JSON файле"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+
+    def _read(self):
+        if not self.path.exists():
+            return 0, None, 0
+        return read_json_document(self.path)
+
+    def load(self):
+        """Возвращает словарь достижений или None, если данных еще нет"""
+        return self._read()[1]
+
+    def load_with_version(self):
+        """Возвращает (версия схемы, словарь достижений или None) за одно чтение файла"""
+        return self._read()[:2]
+
+    def schema_version(self):
+        """Версия схемы сохраненных данных (0 — данные без версии)"""
+        return self._read()[0]
+
+    def save(self, data, changed=None, deleted=None, base_revision=None, schema_version=None):
+        """Сохраняет данные и возвращает новую ревизию.
+
+        changed/deleted — {название: ожидаемая версия}; None в changed означает
+        «записать весь словарь». При частичном сохранении изменения накладываются
+        на актуальное содержимое файла, поэтому чужие записи не затираются.
+        schema_version — новая версия схемы; None оставляет ту, что уже в файле.
+        Возвращает None вместо ревизии, если файл успел измениться после base_revision.
+        """
+        with file_lock(self.lock_path):
+            before = self.revision()
+            stored_version, stored, max_version = self._read()
+            # Версии записей, которые сейчас удалятся или перезапишутся, больше не выдаются
+            max_version = _version_floor(stored or {}, max_version)
+            if schema_version is None:
+                schema_version = stored_version
+            if changed is None:
+                result = data
+            else:
+                result = stored or {}
+                check_versions(lambda name: _version_of(result, name), changed, deleted or {})
+                for name in deleted or {}:
+                    result.pop(name, None)
+                for name in changed:
+                    if name in data:
+                        result[name] = data[name]
+            self._write_atomic(_document(schema_version, result, max_version))
+            after = self.revision()
+        return after if base_revision is None or before == base_revision else None
+
+    def iter_records(self):
+        """Отдает пары (название, запись) по одной"""
+        yield from (self.load() or {}).items()
+
+    def import_records(self, items, schema_version, batch_size=IMPORT_BATCH_SIZE):
+        """Добавляет или заменяет записи из итератора (название, запись) одной записью файла.
+
+        Запись заменяет достижение с тем же названием; достижение с тем же id под другим
+        названием (переименованное после экспорта) удаляется, так что id остается уникальным.
+        Импортированные записи получают версию больше любой, что была в хранилище (включая
+        удаленные записи): открытые в сессиях формы увидят конфликт, а кеши — новую версию.
+        schema_version — версия схемы записей; проставляется, только если данных еще не было.
+        Возвращает число импортированных записей.
+        """
+        with file_lock(self.lock_path):
+            stored_version, result, max_version = self._read()
+            if result is None:
+                result, stored_version = {}, schema_version
+            version = _version_floor(result, max_version) + 1
+            names_by_id = {record.get("id"): name for name, record in result.items()}
+            count = 0
+            for batch in _batched(items, batch_size):
+                for name, record in batch:
+                    old_name = names_by_id.get(record.get("id"))
+                    if old_name is not None and old_name != name:
+                        del result[old_name]
+                    replaced = result.get(name)
+                    if replaced is not None:
+                        names_by_id.pop(replaced.get("id"), None)
+                    record["version"] = version
+                    result[name] = record
+                    names_by_id[record.get("id")] = name
+                count += len(batch)
+            self._write_atomic(_document(stored_version, result, _version_floor(result, max_version)))
+        return count
+
+    def _write_atomic(self, document):
+        data = json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8")
+        perf.count("bytes_written", write_atomic(self.path, [data]))
+
+    def revision(self):
+        """Ревизия данных — время изменения и размер файла"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+class SqliteStorage:
+    """Хранение в SQLite: одна строка на достижение"""
+
+    def __init__(self, path: Path, import_from: Path = None, migrate=None):
+        self.path = Path(path)
+        self.import_from = Path(import_from) if import_from else None
+        # migrate(data, from_version) -> версия схемы после миграции; см. _import
+        self.migrate = migrate
+        # Схема создается при первом обращении к базе, а не в конструкторе: поврежденный
+        # или заблокированный файл должен давать ошибку там, где ее обрабатывают (при загрузке)
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _ensure_schema(self, conn):
+        """Создает таблицы и недостающие колонки один раз на объект хранилища"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with conn:
+                # WAL позволяет читать базу, пока другая сессия в нее пишет
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS achievements (
+                        name TEXT PRIMARY KEY,
+                        id TEXT,
+                        done INTEGER NOT NULL DEFAULT 0,
+                        description TEXT NOT NULL DEFAULT '',
+                        img_gray TEXT,
+                        img_gold TEXT,
+                        category TEXT NOT NULL DEFAULT 'General',
+                        date_received TEXT,
+                        version INTEGER NOT NULL DEFAULT 0
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_achievements_category ON achievements(category);
+                    CREATE INDEX IF NOT EXISTS idx_achievements_done ON achievements(done);
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    );
+                    """
+                )
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(achievements)")}
+                if "version" not in columns:
+                    # База создана до появления версий записей
+                    conn.execute("ALTER TABLE achievements ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                if "id" not in columns:
+                    # База создана до появления неизменяемых id; их проставит миграция при загрузке
+                    conn.execute("ALTER TABLE achievements ADD COLUMN id TEXT")
+                # По id импорт находит переименованные достижения (см. import_records)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_achievements_id ON achievements(id)")
+            self._schema_ready = True
+
+    @contextmanager
+    def _connection(self, write=False):
+        """Открывает соединение на одну операцию: commit при успехе, rollback при ошибке.
+
+        При write=True транзакция сразу берет блокировку на запись (BEGIN IMMEDIATE),
+        чтобы проверка версий и запись не разделялись чужой транзакцией.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._schema_ready:
+                self._ensure_schema(conn)
+            with conn:
+                if write:
+                    conn.execute("BEGIN IMMEDIATE")
+                yield conn
+        finally:
+            conn.close()
+
+    def _is_initialized(self, conn):
+        return conn.execute("SELECT 1 FROM meta WHERE key = 'initialized'").fetchone() is not None
+
+    def _import_if_needed(self, conn):
+        """Забирает data.json в еще не заполненную базу, как это делает первая загрузка.
+
+        Возвращает False, если база пуста и импортировать нечего. После импорта
+        соединение остается в транзакции с блокировкой на запись.
+        """
+        if self._is_initialized(conn):
+            return True
+        if not (self.import_from and self.import_from.exists()):
+            return False
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        if not self._is_initialized(conn):
+            self._import(conn, self.import_from)
+        return True
+
+    def load(self):
+        """Возвращает словарь достижений или None, если база еще ни разу не заполнялась"""
+        return self.load_with_version()[1]
+
+    def load_with_version(self):
+        """Возвращает (версия схемы, словарь достижений или None) из одного снимка базы"""
+        with self._connection() as conn:
+            if not self._import_if_needed(conn):
+                return _read_schema_version(conn), None
+            if not conn.in_transaction:
+                # Обе выборки в одной транзакции: версия схемы соответствует прочитанным строкам
+                conn.execute("BEGIN")
+            rows = conn.execute("SELECT * FROM achievements ORDER BY rowid").fetchall()
+            schema_version = _read_schema_version(conn)
+        perf.count("bytes_read", sum(_payload_size(row) for row in rows))
+        return schema_version, {row["name"]: _row_to_record(row) for row in rows}
+
+    def schema_version(self):
+        """Версия схемы сохраненных данных (0 — данные без версии)"""
+        with self._connection() as conn:
+            self._import_if_needed(conn)
+            return _read_schema_version(conn)
+
+    def save(self, data, changed=None, deleted=None, base_revision=None, schema_version=None):
+        """Сохраняет изменения одной транзакцией и возвращает новую ревизию.
+
+        changed — {название: ожидаемая версия} изменившихся достижений;
+        None означает «сохранить все». deleted — {название: ожидаемая версия} удаленных.
+        schema_version — новая версия схемы; None оставляет прежнюю.
+        Возвращает None вместо ревизии, если база успела измениться после base_revision.
+        """
+        deleted = deleted or {}
+        with self._connection(write=True) as conn:
+            before = _read_revision(conn)
+            # Запоминаем версии до удаления строк: импорт не должен выдать их повторно
+            _remember_max_version(conn)
+            if changed is None:
+                conn.execute(
+                    "DELETE FROM achievements WHERE name NOT IN (SELECT value FROM json_each(?))",
+                    (json.dumps(list(data), ensure_ascii=False),),
+                )
+                changed = dict.fromkeys(data)
+            else:
+                # Частичное сохранение в еще не заполненную базу сначала забирает data.json:
+                # иначе база стала бы инициализированной без него, и импорт уже не случился бы
+                self._import_if_needed(conn)
+                check_versions(lambda name: _stored_version(conn, name), changed, deleted)
+            conn.executemany("DELETE FROM achievements WHERE name = ?", [(name,) for name in deleted])
+            _upsert(conn, ((name, data[name]) for name in changed if name in data))
+            _mark_initialized(conn)
+            if schema_version is not None:
+                _set_schema_version(conn, schema_version)
+            after = _bump_revision(conn)
+        return after if base_revision is None or before == base_revision else None
+
+    def iter_records(self):
+        """Отдает пары (название, запись) по одной строке, не загружая таблицу целиком.
+
+        Как и load, сначала забирает data.json в еще не заполненную базу: иначе экспорт
+        такой установки молча выдал бы пустой архив.
+        """
+        with self._connection() as conn:
+            self._import_if_needed(conn)
+            for row in conn.execute("SELECT * FROM achievements ORDER BY rowid"):
+                yield row["name"], _row_to_record(row)
+
+    def import_records(self, items, schema_version, batch_size=IMPORT_BATCH_SIZE):
+        """Добавляет или заменяет записи из итератора (название, запись) одной транзакцией.
+
+        Записи пишутся пачками по batch_size; при ошибке в любой из них откатывается весь импорт.
+        Запись заменяет достижение с тем же названием; достижение с тем же id под другим
+        названием (переименованное после экспорта) удаляется, так что id остается уникальным.
+        Импортированные записи получают версию больше любой, что была в базе (включая
+        удаленные записи): открытые в сессиях формы увидят конфликт, а кеши — новую версию.
+        schema_version — версия схемы записей; проставляется, только если база была пустой.
+        Возвращает число импортированных записей.
+        """
+        count = 0
+        with self._connection(write=True) as conn:
+            # Сначала забираем data.json, как это сделала бы первая загрузка
+            if not self._import_if_needed(conn):
+                _set_schema_version(conn, schema_version)
+            version = _remember_max_version(conn) + 1
+            for batch in _batched(items, batch_size):
+                for name, record in batch:
+                    conn.execute("DELETE FROM achievements WHERE id = ? AND name != ?", (record.get("id"), name))
+                    record["version"] = version
+                _upsert(conn, batch)
+                count += len(batch)
+            _mark_initialized(conn)
+            _bump_revision(conn)
+        logger.info(f"Импортировано достижений: {count}")
+        return count
+
+    def revision(self):
+        """Ревизия данных — счетчик, который увеличивается при каждой записи"""
+        with self._connection() as conn:
+            return _read_revision(conn)
+
+    def import_json(self, path: Path):
+        """Импортирует достижения из data.json одной транзакцией"""
+        with self._connection(write=True) as conn:
+            return self._import(conn, path)
+
+    def _import(self, conn, path):
+        schema_version, data, max_version = read_json_document(path)
+        if self.migrate is not None:
+            # Мигрируем до записи в таблицу: у колонок есть значения по умолчанию,
+            # и отсутствующее в data.json поле в базе уже не отличить от пустого
+            schema_version = self.migrate(data, schema_version)
+        _upsert(conn, data.items())
+        _set_max_version(conn, max_version)
+        _mark_initialized(conn)
+        # Без migrate данные мигрируются уже в базе, начиная с версии схемы файла
+        _set_schema_version(conn, schema_version)
+        _bump_revision(conn)
+        logger.info(f"Импортировано достижений из {path}: {len(data)}")
+        return len(data)
+
+
+def _version_of(data, name):
+    record = data.get(name)
+    return record.get("version", 0) if record is not None else None
+
+
+def _version_floor(data, max_version):
+    """Наибольшая из версий записей data и ранее запомненной max_version"""
+    return max([max_version, *(record.get("version", 0) for record in data.values())])
+
+
+def _document(schema_version, data, max_version):
+    return {"schema_version": schema_version, "max_version": max_version, "achievements": data}
+
+
+def _batched(items, size):
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _stored_version(conn, name):
+    row = conn.execute("SELECT version FROM achievements WHERE name = ?", (name,)).fetchone()
+    return row["version"] if row else None
+
+
+def _payload_size(values):
+    # Объем данных строки: для SQLite это оценка, а не точное число байт на диске
+    return sum(len(value) if isinstance(value, str) else 8 for value in values if value is not None)
+
+
+def _upsert(conn, items):
+    rows = [
+        (
+            name,
+            record.get("id"),
+            int(bool(record.get("done"))),
+            record.get("description") or "",
+            record.get("img_gray"),
+            record.get("img_gold"),
+            record.get("category") or "General",
+            record.get("date_received"),
+            record.get("version", 0),
+        )
+        for name, record in items
+    ]
+    perf.count("bytes_written", sum(_payload_size(row) for row in rows))
+    # ON CONFLICT DO UPDATE сохраняет rowid, поэтому порядок достижений не меняется
+    conn.executemany(
+        """
+        INSERT INTO achievements (name, id, done, description, img_gray, img_gold, category, date_received, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            id = excluded.id,
+            done = excluded.done,
+            description = excluded.description,
+            img_gray = excluded.img_gray,
+            img_gold = excluded.img_gold,
+            category = excluded.category,
+            date_received = excluded.date_received,
+            version = excluded.version
+        """,
+        rows,
+    )
+
+
+def _mark_initialized(conn):
+    # После первой записи пустая база означает «все удалено», а не «данных еще нет»
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('initialized', '1')")
+
+
+def _set_schema_version(conn, schema_version):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(schema_version),))
+
+
+def _read_schema_version(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    return int(row["value"]) if row else 0
+
+
+def _set_max_version(conn, max_version):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('max_version', ?)", (str(max_version),))
+
+
+def _remember_max_version(conn):
+    """Запоминает и возвращает наибольшую версию записи, которая когда-либо была в базе"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'max_version'").fetchone()
+    stored = conn.execute("SELECT MAX(version) AS version FROM achievements").fetchone()
+    max_version = max(int(row["value"]) if row else 0, stored["version"] or 0)
+    _set_max_version(conn, max_version)
+    return max_version
+
+
+def _read_revision(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+    return int(row["value"]) if row else 0
+
+
+def _bump_revision(conn):
+    revision = _read_revision(conn) + 1
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (str(revision),))
+    return revision
+
+
+def _row_to_record(row):
+    record = {field: row[field] for field in FIELDS}
+    record["done"] = bool(record["done"])
+    return record
+
+
+def open_storage(backend, json_path: Path, sqlite_path: Path, migrate=None):
+    """Создает хранилище по имени бэкенда: "sqlite" (по умолчанию) или "json".
+
+    migrate — миграция data.json перед импортом в SQLite (см. migrations.import_migration).
+    """
+    if backend == "json":
+        return JsonStorage(json_path)
+    if backend == "sqlite":
+        # Существующий data.json импортируется в базу при первой загрузке
+        return SqliteStorage(sqlite_path, import_from=json_path, migrate=migrate)
+    raise ValueError(f"Неизвестный бэкенд хранения: {backend!r}")
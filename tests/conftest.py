@@ -0,0 +1,44 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from model import Achievements
+from storage import open_storage
+
+
+def make_record(record_id, description="", done=False, category="General", version=0):
+    """Запись достижения текущей схемы"""
+    return {
+        "id": record_id,
+        "done": done,
+        "description": description,
+        "img_gray": None,
+        "img_gold": None,
+        "category": category,
+        "date_received": None,
+        "version": version,
+    }
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    """Пустое хранилище каждого бэкенда"""
+    return open_storage(request.param, tmp_path / "data.json", tmp_path / "data.db")
+
+
+@pytest.fixture
+def saved(storage):
+    """Хранилище с двумя сохраненными достижениями"""
+    storage.save({"Run": make_record("run"), "Read": make_record("read")})
+    return storage
+
+
+def load_board(storage):
+    """Доска, прочитанная из хранилища"""
+    board = Achievements()
+    board.reload(storage)
+    return board
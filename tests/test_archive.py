@@ -0,0 +1,138 @@
+from io import BytesIO
+import hashlib
+import json
+import zipfile
+
+from PIL import Image
+import pytest
+
+from archive import ArchiveError, export_archive, import_archive
+from conftest import make_record
+from image_store import ImageStore
+from migrations import SCHEMA_VERSION
+
+
+@pytest.fixture
+def image_store(tmp_path):
+    return ImageStore(tmp_path / "images")
+
+
+def png_bytes(size=(4, 4), mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def ref_of(data):
+    return f"{hashlib.sha256(data).hexdigest()}.png"
+
+
+def line(name, record_id, **fields):
+    record = make_record(record_id)
+    del record["version"]
+    return {"name": name, **record, **fields}
+
+
+def write_archive(path, lines, manifest=None, images=None):
+    with zipfile.ZipFile(path, "w") as zf:
+        if manifest is not False:
+            zf.writestr("manifest.json", json.dumps(manifest or {"format": 1, "schema_version": SCHEMA_VERSION}))
+        zf.writestr("achievements.ndjson", "".join(json.dumps(item) + "\n" for item in lines))
+        for ref, data in (images or {}).items():
+            zf.writestr("images/" + ref, data)
+    return path
+
+
+def test_export_and_import_round_trip(tmp_path, storage, image_store):
+    ref = image_store.put(png_bytes())
+    storage.save({"Run": make_record("run", "10 km") | {"img_gold": ref}, "Read": make_record("read")})
+    archive = tmp_path / "backup.zip"
+    assert export_archive(storage, image_store, archive) == 2
+
+    target_store = ImageStore(tmp_path / "restored")
+    target = type(storage)(tmp_path / ("restored" + storage.path.suffix))
+    assert import_archive(archive, target, target_store) == 2
+    restored = target.load()
+    assert restored["Run"]["description"] == "10 km"
+    assert restored["Run"]["img_gold"] == ref
+    assert target_store.exists(ref)
+
+
+def test_import_rejects_missing_manifest(tmp_path, storage, image_store):
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run")], manifest=False)
+    with pytest.raises(ArchiveError, match="manifest.json"):
+        import_archive(archive, storage, image_store)
+
+
+@pytest.mark.parametrize("manifest", [
+    {"format": 2, "schema_version": SCHEMA_VERSION},
+    {"format": 1, "schema_version": SCHEMA_VERSION + 1},
+    {"format": 1, "schema_version": "3"},
+])
+def test_import_rejects_unsupported_manifest(tmp_path, storage, image_store, manifest):
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run")], manifest=manifest)
+    with pytest.raises(ArchiveError):
+        import_archive(archive, storage, image_store)
+
+
+def test_import_rejects_non_zip(tmp_path, storage, image_store):
+    path = tmp_path / "a.zip"
+    path.write_bytes(b"not a zip")
+    with pytest.raises(ArchiveError):
+        import_archive(path, storage, image_store)
+
+
+@pytest.mark.parametrize("fields", [
+    {"id": ""},
+    {"done": "yes"},
+    {"description": None},
+    {"category": "  "},
+    {"date_received": "17.10.2026"},
+    {"img_gray": "../../etc/passwd"},
+])
+def test_import_rejects_invalid_fields(tmp_path, storage, image_store, fields):
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run", **fields)])
+    with pytest.raises(ArchiveError, match="Run"):
+        import_archive(archive, storage, image_store)
+    assert storage.load() is None
+
+
+def test_import_rejects_duplicate_ids(tmp_path, storage, image_store):
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "same"), line("Read", "same")])
+    with pytest.raises(ArchiveError, match="same"):
+        import_archive(archive, storage, image_store)
+    # Импорт атомарный: первая запись тоже не попала в хранилище
+    assert storage.load() is None
+
+
+def test_import_migrates_old_schema(tmp_path, storage, image_store):
+    item = {"name": "Run", "done": False, "description": ""}
+    archive = write_archive(tmp_path / "a.zip", [item], manifest={"format": 1, "schema_version": 0})
+    import_archive(archive, storage, image_store)
+    record = storage.load()["Run"]
+    assert record["category"] == "General"
+    assert record["id"]
+
+
+def test_import_resets_missing_image(tmp_path, storage, image_store):
+    ref = ref_of(png_bytes())
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run", img_gray=ref)])
+    import_archive(archive, storage, image_store)
+    assert storage.load()["Run"]["img_gray"] is None
+
+
+def test_import_rejects_image_with_wrong_hash(tmp_path, storage, image_store):
+    ref = ref_of(b"something else")
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run", img_gray=ref)], images={ref: png_bytes()})
+    with pytest.raises(ArchiveError):
+        import_archive(archive, storage, image_store)
+    assert not image_store.exists(ref)
+
+
+def test_import_rejects_image_over_pixel_limit(tmp_path, storage, image_store):
+    data = png_bytes((9000, 9000), mode="1")
+    ref = ref_of(data)
+    archive = write_archive(tmp_path / "a.zip", [line("Run", "run", img_gray=ref)], images={ref: data})
+    with pytest.raises(ArchiveError, match="9000x9000"):
+        import_archive(archive, storage, image_store)
+    assert not image_store.exists(ref)
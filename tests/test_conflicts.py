@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from conftest import load_board, make_record
+from model import LOAD_FAILED, Achievements, BoardNotLoadedError
+from storage import ConflictError, SqliteStorage
+
+
+def test_save_rejects_stale_version(storage):
+    storage.save({"Run": make_record("run")})
+    with pytest.raises(ConflictError):
+        storage.save({"Run": make_record("run", version=2)}, changed={"Run": 1})
+    assert storage.load()["Run"]["version"] == 0
+
+
+def test_save_rejects_delete_of_changed_record(storage):
+    storage.save({"Run": make_record("run", version=3)})
+    with pytest.raises(ConflictError):
+        storage.save({}, changed={}, deleted={"Run": 2})
+    assert "Run" in storage.load()
+
+
+def test_partial_save_keeps_other_records(storage):
+    storage.save({"Run": make_record("run"), "Read": make_record("read")})
+    storage.save({"Run": make_record("run", "edited", version=1)}, changed={"Run": 0})
+    stored = storage.load()
+    assert stored["Run"]["description"] == "edited"
+    assert stored["Read"]["id"] == "read"
+
+
+def test_flush_conflict_on_concurrent_edit_reloads_board(saved):
+    first, second = load_board(saved), load_board(saved)
+    first["Run"]["description"] = "first"
+    first.mark_changed("Run")
+    first.flush(saved)
+
+    second["Run"]["description"] = "second"
+    second.mark_changed("Run")
+    with pytest.raises(ConflictError) as error:
+        second.flush(saved)
+    assert error.value.name == "Run"
+    # Отвергнутая правка отброшена, доска перечитана из хранилища
+    assert not second.is_dirty
+    assert second["Run"]["description"] == "first"
+    assert saved.load()["Run"]["description"] == "first"
+
+
+def test_flush_conflict_on_delete_of_edited_record(saved):
+    first, second = load_board(saved), load_board(saved)
+    first["Run"]["done"] = True
+    first.mark_changed("Run")
+    first.flush(saved)
+
+    del second["Run"]
+    with pytest.raises(ConflictError):
+        second.flush(saved)
+    assert "Run" in saved.load()
+
+
+def test_flush_conflict_on_edit_of_deleted_record(saved):
+    first, second = load_board(saved), load_board(saved)
+    del first["Run"]
+    first.flush(saved)
+
+    second["Run"]["done"] = True
+    second.mark_changed("Run")
+    with pytest.raises(ConflictError):
+        second.flush(saved)
+    assert "Run" not in second
+    assert "Run" not in saved.load()
+
+
+def test_flush_conflict_on_create_with_taken_name(saved):
+    first, second = load_board(saved), load_board(saved)
+    first["Swim"] = make_record("swim-1")
+    first.flush(saved)
+
+    second["Swim"] = make_record("swim-2")
+    with pytest.raises(ConflictError):
+        second.flush(saved)
+    assert saved.load()["Swim"]["id"] == "swim-1"
+
+
+def test_flush_refuses_board_that_failed_to_load(saved):
+    board = Achievements({"Swim": make_record("swim")})
+    board.revision = LOAD_FAILED
+    board["Run"] = make_record("other")
+    with pytest.raises(BoardNotLoadedError):
+        board.flush(saved)
+    assert not board.is_dirty
+    assert saved.load()["Run"]["id"] == "run"
+
+
+def test_sqlite_partial_save_imports_legacy_json_first(tmp_path):
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps({"Run": make_record("run")}), encoding="utf-8")
+    storage = SqliteStorage(tmp_path / "data.db", import_from=data_file)
+    storage.save({"Swim": make_record("swim")}, changed={"Swim": None})
+    assert set(storage.load()) == {"Run", "Swim"}
+
+
+def test_sqlite_partial_save_with_broken_legacy_json_keeps_database_empty(tmp_path):
+    data_file = tmp_path / "data.json"
+    data_file.write_bytes(json.dumps({"Run": make_record("run")}).encode() + b"\0")
+    storage = SqliteStorage(tmp_path / "data.db", import_from=data_file)
+    with pytest.raises(json.JSONDecodeError):
+        storage.save({"Swim": make_record("swim")}, changed={"Swim": None})
+    # После починки файла данные из него все еще импортируются
+    data_file.write_text(json.dumps({"Run": make_record("run")}), encoding="utf-8")
+    assert set(storage.load()) == {"Run"}
@@ -0,0 +1,113 @@
+from datetime import date
+
+import pytest
+
+from events import CREATE, LOCK, SNAPSHOT, UNLOCK, EventLog, EventStats
+
+
+def unlock(day, name="Run"):
+    return {"ts": f"{day}T12:00:00", "type": UNLOCK, "id": name.lower(), "name": name}
+
+
+def stats_for(*days):
+    stats = EventStats()
+    for day in days:
+        stats.apply(unlock(day))
+    return stats
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "events.ndjson"
+
+
+def test_days_out_of_order_merge_into_one_streak():
+    stats = stats_for("2024-03-01", "2024-03-03", "2024-03-05", "2024-03-02", "2024-03-04")
+    start = date(2024, 3, 1).toordinal()
+    assert stats.streak_starts == {start: start + 4}
+    assert stats.streak_ends == {start + 4: start}
+    assert stats.longest_streak == 5
+
+
+def test_same_day_unlocks_do_not_extend_streak():
+    stats = stats_for("2024-03-01", "2024-03-01", "2024-03-02")
+    assert stats.unlocks_per_day == {"2024-03-01": 2, "2024-03-02": 1}
+    assert stats.longest_streak == 2
+
+
+def test_current_streak_ends_today_or_yesterday():
+    stats = stats_for("2024-03-01", "2024-03-02", "2024-03-05", "2024-03-06", "2024-03-07")
+    assert stats.longest_streak == 3
+    assert stats.current_streak(today=date(2024, 3, 7)) == 3
+    assert stats.current_streak(today=date(2024, 3, 8)) == 3
+    assert stats.current_streak(today=date(2024, 3, 9)) == 0
+
+
+def test_unlocks_last_days_includes_empty_days():
+    stats = stats_for("2024-03-01", "2024-03-03", "2024-03-03")
+    assert stats.unlocks_last_days(4, today=date(2024, 3, 3)) == {
+        "2024-02-29": 0, "2024-03-01": 1, "2024-03-02": 0, "2024-03-03": 2,
+    }
+
+
+def test_snapshot_round_trip():
+    stats = stats_for("2024-03-01", "2024-03-02", "2024-03-04")
+    stats.apply({"ts": "2024-03-04T13:00:00", "type": LOCK, "id": "run", "name": "Run"})
+    restored = EventStats.from_snapshot(stats.to_snapshot())
+    assert restored.to_snapshot() == stats.to_snapshot()
+    # Восстановленные серии продолжают склеиваться
+    restored.apply(unlock("2024-03-03"))
+    assert restored.longest_streak == 4
+
+
+def test_recent_keeps_last_events_only():
+    stats = EventStats(recent_events=2)
+    for day in ("2024-03-01", "2024-03-02", "2024-03-03"):
+        stats.apply(unlock(day))
+    assert [event["ts"][:10] for event in stats.recent] == ["2024-03-02", "2024-03-03"]
+
+
+def test_append_is_seen_by_other_log_on_refresh(log_path):
+    writer, reader = EventLog(log_path), EventLog(log_path)
+    writer.append(UNLOCK, "run", "Run")
+    writer.append(CREATE, "read", "Read")
+    assert reader.refresh().counts == {UNLOCK: 1, CREATE: 1}
+    writer.append(LOCK, "run", "Run")
+    assert reader.refresh().counts == {UNLOCK: 1, CREATE: 1, LOCK: 1}
+
+
+def test_log_compacts_after_limit(log_path):
+    log = EventLog(log_path, compact_after=3)
+    for _ in range(3):
+        log.append(UNLOCK, "run", "Run")
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1 and SNAPSHOT in lines[0]
+    assert log.stats.counts == {UNLOCK: 3}
+    log.append(LOCK, "run", "Run")
+    assert EventLog(log_path).refresh().counts == {UNLOCK: 3, LOCK: 1}
+
+
+def test_refresh_after_compaction_by_other_log(log_path):
+    writer, reader = EventLog(log_path), EventLog(log_path)
+    writer.append(UNLOCK, "run", "Run")
+    writer.append(CREATE, "read", "Read")
+    assert reader.refresh().counts == {UNLOCK: 1, CREATE: 1}
+    # После сжатия файл короче прочитанного — читатель перечитывает его со снимка, не удваивая счетчики
+    writer.compact()
+    writer.append(LOCK, "run", "Run")
+    assert reader.refresh().counts == {UNLOCK: 1, CREATE: 1, LOCK: 1}
+
+
+def test_corrupt_and_unfinished_lines_are_skipped(log_path):
+    log_path.write_text(
+        '{"ts": "2024-03-01T12:00:00", "type": "unlock", "id": "run", "name": "Run"}\n'
+        "{broken\n"
+        '{"ts": "2024-03-02T12:00:00", "type": "unl',
+        encoding="utf-8",
+    )
+    log = EventLog(log_path)
+    assert log.refresh().counts == {UNLOCK: 1}
+    # Недописанная строка подхватывается, когда ее допишут
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('ock", "id": "run", "name": "Run"}\n')
+    assert log.refresh().unlocks_per_day == {"2024-03-01": 1, "2024-03-02": 1}
@@ -0,0 +1,33 @@
+import pytest
+
+from fileio import file_lock, write_atomic
+
+
+def test_write_atomic_replaces_file(tmp_path):
+    target = tmp_path / "data.json"
+    target.write_bytes(b"old")
+    assert write_atomic(target, [b"new ", b"data"]) == 8
+    assert target.read_bytes() == b"new data"
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_write_atomic_keeps_old_file_when_verify_fails(tmp_path):
+    target = tmp_path / "data.json"
+    target.write_bytes(b"old")
+
+    def verify():
+        raise ValueError("bad content")
+
+    with pytest.raises(ValueError):
+        write_atomic(target, [b"new"], verify)
+    assert target.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [target]
+
+
+def test_file_lock_is_released_after_block(tmp_path):
+    lock_path = tmp_path / "data.json.lock"
+    with file_lock(lock_path):
+        pass
+    with file_lock(lock_path):
+        pass
+    assert lock_path.exists()
@@ -0,0 +1,104 @@
+import hashlib
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image_store import (
+    MAX_DIMENSION, VARIANT_SIZES, ImageStore, ImageTooLargeError, InvalidImageError, open_checked, variant_ref,
+)
+
+
+def image_bytes(size=(32, 16), fmt="PNG", mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(tmp_path / "images")
+
+
+def test_open_checked_reads_header_only():
+    image = open_checked(BytesIO(image_bytes((32, 16))))
+    assert image.format == "PNG"
+    assert image.size == (32, 16)
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image at all"])
+def test_open_checked_rejects_empty_and_non_images(data):
+    with pytest.raises(InvalidImageError):
+        open_checked(BytesIO(data))
+
+
+def test_open_checked_rejects_disallowed_format():
+    with pytest.raises(InvalidImageError, match="BMP"):
+        open_checked(BytesIO(image_bytes(fmt="BMP")))
+
+
+def test_open_checked_rejects_file_over_max_bytes():
+    data = image_bytes()
+    with pytest.raises(ImageTooLargeError):
+        open_checked(BytesIO(data), max_bytes=len(data) - 1)
+
+
+def test_open_checked_rejects_too_large_dimension():
+    with pytest.raises(ImageTooLargeError):
+        open_checked(BytesIO(image_bytes((MAX_DIMENSION + 1, 1), mode="1")))
+
+
+def test_open_checked_rejects_too_many_pixels():
+    # Обе стороны в пределах MAX_DIMENSION, но в сумме пикселей больше MAX_PIXELS
+    with pytest.raises(ImageTooLargeError):
+        open_checked(BytesIO(image_bytes((5000, 5000), mode="1")))
+
+
+def test_ingest_stream_stores_original_and_variants(store):
+    ref = store.ingest_stream(BytesIO(image_bytes((1000, 500))))
+    assert store.exists(ref)
+    for variant, size in VARIANT_SIZES.items():
+        with Image.open(store.path(variant_ref(ref, variant))) as image:
+            assert image.format == "WEBP"
+            assert max(image.size) <= size
+
+
+def test_ingest_stream_rejects_oversized_upload(store):
+    data = image_bytes()
+    with pytest.raises(ImageTooLargeError):
+        store.ingest_stream(BytesIO(data), max_bytes=len(data) - 1)
+    assert not store.root.exists() or not any(store.root.iterdir())
+
+
+def test_variant_is_created_on_first_request(store):
+    ref = store.put(image_bytes((600, 600)))
+    target = store.variant(ref, "card")
+    assert target == variant_ref(ref, "card")
+    with Image.open(store.path(target)) as image:
+        assert max(image.size) <= VARIANT_SIZES["card"]
+
+
+def test_variant_falls_back_to_original_for_oversized_image(store):
+    ref = store.put(image_bytes((MAX_DIMENSION + 1, 1), mode="1"))
+    assert store.variant(ref, "card") == ref
+    assert not store.path(variant_ref(ref, "card")).exists()
+
+
+def test_put_file_checks_content_hash(store):
+    data = image_bytes()
+    ref = f"{hashlib.sha256(data).hexdigest()}.png"
+    assert store.put_file(ref, BytesIO(data)) == ref
+    assert store.read(ref) == data
+
+    wrong_ref = f"{hashlib.sha256(b'other').hexdigest()}.png"
+    with pytest.raises(InvalidImageError):
+        store.put_file(wrong_ref, BytesIO(data))
+    assert not store.path(wrong_ref).exists()
+
+
+def test_put_file_rejects_file_over_max_bytes(store):
+    data = image_bytes()
+    ref = f"{hashlib.sha256(data).hexdigest()}.png"
+    with pytest.raises(InvalidImageError):
+        store.put_file(ref, BytesIO(data), max_bytes=len(data) - 1)
+    assert not store.path(ref).exists()
@@ -0,0 +1,75 @@
+import json
+
+from conftest import make_record
+from migrations import SCHEMA_VERSION
+from storage import SqliteStorage
+
+
+def imported(record_id, description=""):
+    """Запись из архива: версию назначает хранилище"""
+    record = make_record(record_id, description)
+    del record["version"]
+    return record
+
+
+def test_import_adds_new_records(storage):
+    count = storage.import_records([("Run", imported("run")), ("Read", imported("read"))],
+                                   schema_version=SCHEMA_VERSION)
+    assert count == 2
+    assert set(storage.load()) == {"Run", "Read"}
+    assert storage.schema_version() == SCHEMA_VERSION
+
+
+def test_import_replaces_record_with_newer_version(storage):
+    storage.save({"Run": make_record("run", version=4)})
+    storage.import_records([("Run", imported("run", "from archive"))], schema_version=SCHEMA_VERSION)
+    stored = storage.load()["Run"]
+    assert stored["description"] == "from archive"
+    assert stored["version"] > 4
+
+
+def test_import_moves_renamed_record_and_keeps_id_unique(storage):
+    storage.save({"Run": make_record("run", version=2), "Read": make_record("read")})
+    storage.import_records([("Run 10 km", imported("run"))], schema_version=SCHEMA_VERSION)
+    stored = storage.load()
+    assert set(stored) == {"Run 10 km", "Read"}
+    assert stored["Run 10 km"]["version"] > 2
+    assert [record["id"] for record in stored.values()].count("run") == 1
+
+
+def test_import_of_deleted_record_does_not_reuse_version(storage):
+    storage.save({"Run": make_record("run")})
+    storage.save({"Run": make_record("run", "edited", version=5)}, changed={"Run": 0})
+    storage.save({}, changed={}, deleted={"Run": 5})
+    storage.import_records([("Run", imported("run"))], schema_version=SCHEMA_VERSION)
+    # Версии 0..5 уже видели сессии и кеши: восстановленная запись получает новую
+    assert storage.load()["Run"]["version"] > 5
+
+
+def test_import_versions_keep_growing(storage):
+    storage.import_records([("Run", imported("run"))], schema_version=SCHEMA_VERSION)
+    first = storage.load()["Run"]["version"]
+    storage.save({}, changed={}, deleted={"Run": first})
+    storage.import_records([("Run", imported("run"))], schema_version=SCHEMA_VERSION)
+    assert storage.load()["Run"]["version"] > first
+
+
+def test_import_keeps_schema_version_of_existing_data(storage):
+    storage.save({"Run": make_record("run")}, schema_version=1)
+    storage.import_records([("Read", imported("read"))], schema_version=SCHEMA_VERSION)
+    assert storage.schema_version() == 1
+
+
+def test_sqlite_reads_legacy_json_before_export(tmp_path):
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps({"Run": make_record("run")}), encoding="utf-8")
+    storage = SqliteStorage(tmp_path / "data.db", import_from=data_file)
+    assert dict(storage.iter_records())["Run"]["id"] == "run"
+
+
+def test_sqlite_import_records_into_legacy_install_keeps_json_records(tmp_path):
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps({"Run": make_record("run")}), encoding="utf-8")
+    storage = SqliteStorage(tmp_path / "data.db", import_from=data_file)
+    storage.import_records([("Read", imported("read"))], schema_version=SCHEMA_VERSION)
+    assert set(storage.load()) == {"Run", "Read"}
@@ -0,0 +1,72 @@
+import base64
+from io import BytesIO
+import json
+
+from PIL import Image
+import pytest
+
+from image_store import ImageStore, is_image_ref
+from migrations import SCHEMA_VERSION, import_migration, migrate
+from storage import SqliteStorage
+
+
+@pytest.fixture
+def image_store(tmp_path):
+    return ImageStore(tmp_path / "images")
+
+
+def png_base64():
+    buffer = BytesIO()
+    Image.new("RGB", (4, 4), "gold").save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def legacy_board():
+    """data.json версии 0: без категорий, дат и id, картинки встроены в base64"""
+    return {
+        "Run": {"done": True, "description": "10 km", "img_gray": None, "img_gold": png_base64()},
+        "Read": {"done": False, "description": "5 books", "img_gray": None, "img_gold": None},
+    }
+
+
+def test_migrate_from_version_0(image_store):
+    data = legacy_board()
+    assert migrate(data, 0, image_store) is True
+    run, read = data["Run"], data["Read"]
+    assert run["category"] == read["category"] == "General"
+    assert run["date_received"] is not None
+    assert read["date_received"] is None
+    assert is_image_ref(run["img_gold"])
+    assert image_store.exists(run["img_gold"])
+    assert run["id"] and read["id"] and run["id"] != read["id"]
+
+
+def test_migrate_keeps_fields_set_by_older_code(image_store):
+    data = {"Run": {"done": True, "description": "", "category": "Fitness", "date_received": "2024-01-02",
+                    "img_gray": None, "img_gold": None, "id": "run"}}
+    migrate(data, 0, image_store)
+    assert data["Run"]["category"] == "Fitness"
+    assert data["Run"]["date_received"] == "2024-01-02"
+    assert data["Run"]["id"] == "run"
+
+
+def test_migrate_current_version_is_noop(image_store):
+    data = {"Run": {"done": False}}
+    assert migrate(data, SCHEMA_VERSION, image_store) is False
+    assert data == {"Run": {"done": False}}
+
+
+def test_migrate_rejects_newer_schema(image_store):
+    with pytest.raises(ValueError):
+        migrate({}, SCHEMA_VERSION + 1, image_store)
+
+
+def test_sqlite_migrates_legacy_json_on_first_load(tmp_path, image_store):
+    data_file = tmp_path / "data.json"
+    data_file.write_text(json.dumps(legacy_board()), encoding="utf-8")
+    storage = SqliteStorage(tmp_path / "data.db", import_from=data_file, migrate=import_migration(image_store))
+    schema_version, data = storage.load_with_version()
+    assert schema_version == SCHEMA_VERSION
+    assert data["Run"]["category"] == "General"
+    assert is_image_ref(data["Run"]["img_gold"])
+    assert all(record["id"] for record in data.values())
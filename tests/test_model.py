@@ -0,0 +1,39 @@
+from conftest import load_board, make_record
+from model import save_stats
+
+
+def test_flush_without_changes_skips_storage(saved):
+    board = load_board(saved)
+    revision = saved.revision()
+    avoided = save_stats["writes_avoided"]
+    assert board.flush(saved) is False
+    assert saved.revision() == revision
+    assert save_stats["writes_avoided"] == avoided + 1
+
+
+def test_flush_writes_only_changed_records(saved):
+    board = load_board(saved)
+    board["Run"]["description"] = "10 km"
+    board.mark_changed("Run")
+    assert board.is_dirty
+    assert board.flush(saved) is True
+    assert not board.is_dirty
+    stored = saved.load()
+    assert stored["Run"]["description"] == "10 km"
+    assert stored["Run"]["version"] == 1
+    assert stored["Read"]["version"] == 0
+
+
+def test_flush_adds_and_deletes_records(saved):
+    board = load_board(saved)
+    board["Swim"] = make_record("swim")
+    del board["Read"]
+    board.flush(saved)
+    assert set(saved.load()) == {"Run", "Swim"}
+
+
+def test_delete_of_unsaved_record_is_not_tracked(saved):
+    board = load_board(saved)
+    board["Swim"] = make_record("swim")
+    del board["Swim"]
+    assert not board.is_dirty
@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+
+import perf
+
+
+@pytest.fixture
+def perf_enabled(monkeypatch):
+    monkeypatch.setattr(perf, "enabled", True)
+    monkeypatch.setattr(perf, "timers", {})
+    monkeypatch.setattr(perf, "counters", dict.fromkeys(perf.counters, 0))
+
+
+def test_script_run_collects_own_timers(perf_enabled, caplog):
+    perf.begin_run()
+    with perf.timed("load"):
+        pass
+    assert set(perf.last_run_timers()) == {"load"}
+    with caplog.at_level(logging.INFO, logger="perf"):
+        entry = perf.end_run()
+    assert entry["timers"]["load"]["calls"] == 1
+    assert caplog.messages[-1].startswith("perf {")
+    assert perf.counters["reruns"] == 1
+    assert perf.last_run_timers() == {}
+
+
+def test_fragment_rerun_is_counted_and_logged_separately(perf_enabled, caplog):
+    perf.begin_run(perf.FRAGMENT)
+    with perf.timed("render_achievement"):
+        pass
+    with caplog.at_level(logging.INFO, logger="perf"):
+        entry = perf.end_run()
+    assert list(entry["timers"]) == ["render_achievement"]
+    assert caplog.messages[-1].startswith("perf fragment {")
+    assert perf.counters["fragment_reruns"] == 1
+    assert perf.counters["reruns"] == 0
+
+
+def test_disabled_timers_still_count_runs(monkeypatch):
+    monkeypatch.setattr(perf, "enabled", False)
+    monkeypatch.setattr(perf, "counters", dict.fromkeys(perf.counters, 0))
+    perf.begin_run(perf.FRAGMENT)
+    assert perf.end_run() is None
+    assert perf.counters["fragment_reruns"] == 1
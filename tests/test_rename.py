@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import load_board
+from storage import ConflictError
+
+
+def test_rename_keeps_id_and_moves_record(saved):
+    board = load_board(saved)
+    board.rename("Run", "Run 10 km")
+    board.flush(saved)
+    stored = saved.load()
+    assert "Run" not in stored
+    assert stored["Run 10 km"]["id"] == "run"
+    assert set(stored) == {"Read", "Run 10 km"}
+
+
+def test_rename_continues_version(saved):
+    board = load_board(saved)
+    seen = board.version("Run")
+    board.rename("Run", "Run 10 km")
+    board.rename("Run 10 km", "Run")
+    # После переименования туда и обратно версия не возвращается к уже виденной
+    assert board.version("Run") > seen
+    board.flush(saved)
+    assert saved.load()["Run"]["version"] == board.version("Run")
+
+
+def test_rename_conflicts_with_concurrent_edit(saved):
+    first, second = load_board(saved), load_board(saved)
+    first["Run"]["done"] = True
+    first.mark_changed("Run")
+    first.flush(saved)
+
+    second.rename("Run", "Run 10 km")
+    with pytest.raises(ConflictError):
+        second.flush(saved)
+    stored = saved.load()
+    assert "Run 10 km" not in stored
+    assert stored["Run"]["done"] is True
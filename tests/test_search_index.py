@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import make_record
+from model import Achievements
+from search_index import SORT_NEWEST, SORT_OLDEST, AchievementIndex, normalize_category
+
+
+def record(record_id, description="", done=False, category="General", date=None):
+    return make_record(record_id, description, done, category) | {"date_received": date}
+
+
+@pytest.fixture
+def index():
+    return AchievementIndex({
+        "Run 10 km": record("run", "long run", done=True, category="Fitness", date="2024-03-01"),
+        "Swim": record("swim", "pool", category="Fitness"),
+        "Plank": record("plank", done=True, category="Fitness", date="2024-05-10"),
+        "Read 5 books": record("read", "Fiction", done=True, category="learning", date="2024-04-01"),
+        "Meditate": record("meditate", category=" "),
+    })
+
+
+def test_normalize_category():
+    assert normalize_category(" Fitness ") == "Fitness"
+    assert normalize_category("") == "General"
+    assert normalize_category(None) == "General"
+
+
+def test_categories_sorted_case_insensitive(index):
+    assert index.categories() == ["Fitness", "General", "learning"]
+
+
+def test_query_without_filters_keeps_board_order(index):
+    assert index.query() == {
+        "Fitness": ["Run 10 km", "Swim", "Plank"],
+        "General": ["Meditate"],
+        "learning": ["Read 5 books"],
+    }
+
+
+def test_query_text_matches_name_and_description_ignoring_case(index):
+    assert index.query(text="RUN") == {"Fitness": ["Run 10 km"]}
+    assert index.query(text="fiction") == {"learning": ["Read 5 books"]}
+    assert index.query(text="nothing") == {}
+
+
+def test_query_filters_by_category_status_and_dates(index):
+    assert index.query(categories={"Fitness"}, done=False) == {"Fitness": ["Swim"]}
+    assert index.query(date_from="2024-03-15", date_to="2024-04-30") == {"learning": ["Read 5 books"]}
+    # Записи без даты не попадают под фильтр по дате
+    assert "Swim" not in index.query(date_from="2000-01-01").get("Fitness", [])
+
+
+def test_query_sorts_by_date_with_undated_last(index):
+    assert index.query(categories={"Fitness"}, sort=SORT_NEWEST) == {"Fitness": ["Plank", "Run 10 km", "Swim"]}
+    assert index.query(categories={"Fitness"}, sort=SORT_OLDEST) == {"Fitness": ["Run 10 km", "Plank", "Swim"]}
+
+
+def test_completion_counts(index):
+    assert index.completion() == {"Fitness": (2, 3), "General": (0, 1), "learning": (1, 1)}
+
+
+def test_update_moves_record_between_categories(index):
+    index.update("Swim", record("swim", done=True, category="Water"))
+    assert index.query(categories={"Water"}) == {"Water": ["Swim"]}
+    assert index.completion()["Fitness"] == (2, 2)
+    assert index.completion()["Water"] == (1, 1)
+
+
+def test_remove_drops_empty_category(index):
+    index.remove("Meditate")
+    assert "General" not in index.categories()
+    assert "General" not in index.completion()
+
+
+def test_board_keeps_index_in_sync():
+    board = Achievements({"Run": record("run", category="Fitness")})
+    board["Read"] = record("read", category="Learning")
+    board["Run"]["done"] = True
+    board.mark_changed("Run")
+    del board["Read"]
+    assert board.index.completion() == {"Fitness": (1, 1)}
@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from conftest import make_record
+from model import LOAD_FAILED, Achievements, SharedAchievements
+from storage import SqliteStorage
+
+
+class BrokenStorage:
+    """Хранилище, которое перестало открываться после первой загрузки"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.broken = False
+
+    def revision(self):
+        if self.broken:
+            raise sqlite3.OperationalError("database is locked")
+        return self.storage.revision()
+
+
+def test_corrupt_database_fails_on_load_not_on_open(tmp_path):
+    path = tmp_path / "data.db"
+    path.write_bytes(b"not a database" * 100)
+    storage = SqliteStorage(path)
+    with pytest.raises(sqlite3.DatabaseError):
+        storage.load_with_version()
+
+
+def test_shared_board_keeps_loaded_board_when_revision_fails(saved):
+    storage = BrokenStorage(saved)
+    shared = SharedAchievements(storage, lambda: Achievements(saved.load()))
+    board = shared.get()
+    storage.broken = True
+    assert shared.get() is board
+
+
+def test_shared_board_falls_back_when_storage_never_opened(saved):
+    storage = BrokenStorage(saved)
+    storage.broken = True
+
+    def failing_loader():
+        fallback = Achievements({"Default": make_record("default")})
+        fallback.revision = LOAD_FAILED
+        return fallback
+
+    shared = SharedAchievements(storage, failing_loader)
+    assert list(shared.get()) == ["Default"]
+    # Подставленная доска не кешируется: как только хранилище ожило, данные перечитываются
+    storage.broken = False
+    shared.loader = lambda: Achievements(saved.load())
+    assert set(shared.get()) == {"Run", "Read"}
@@ -0,0 +1,44 @@
+"""Состояние карточек достижений в session_state.
+
+Вместо пяти строковых ключей на каждое достижение в session_state лежит один
+словарь ``cards``: ``{id достижения: CardState}``. Состояние создается лениво —
+только для карточек, которые действительно отрисовывались в этой сессии, —
+и привязано к неизменяемому id, поэтому переименование ничего не перекладывает.
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+
+CARDS_KEY = "cards"
+
+
+@dataclass(slots=True)
+class CardState:
+    """UI-состояние одной карточки в текущей сессии"""
+    toast_shown: bool = False
+    show_popup: bool = False
+    show_edit: bool = False
+    show_delete: bool = False
+    # Версии достижения, которые видел пользователь, открывая редактирование и удаление
+    edit_version: int = None
+    delete_version: int = None
+
+
+def card_state(achievement_id, done=False):
+    """Возвращает состояние карточки, создавая его при первом обращении"""
+    cards = st.session_state.setdefault(CARDS_KEY, {})
+    state = cards.get(achievement_id)
+    if state is None:
+        state = cards[achievement_id] = CardState(toast_shown=done)
+    return state
+
+
+def done_key(achievement_id):
+    """Ключ виджета-чекбокса «Done» карточки"""
+    return f"done_{achievement_id}"
+
+
+def drop_card_state(achievement_id):
+    """Удаляет состояние карточки удаленного достижения"""
+    st.session_state.get(CARDS_KEY, {}).pop(achievement_id, None)
+    st.session_state.pop(done_key(achievement_id), None)